@@ -15,17 +15,104 @@ pip install asyncssh
 
 import asyncio
 import asyncssh
-import socket
+import inspect
+import sys
 import time
-import socks
-from typing import Optional, Dict, Any, Tuple, Union, List
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, Tuple, Union, List, Set, Iterable, Callable, Awaitable
+
+from socks5_async import (Socks5Tunnel, Socks5HealthProbe, ProxyUnreachableError, Socks5ConnectError,
+                          scan_open_ports, socks5_handshake)
+from proxy_registry import ProxyRegistry, ProxyBalancer, get_proxy_registry
+from batch_engine import iter_bounded, CancelToken, BatchCancelledError
+from batch_journal import BatchJournal, host_id
+from host_history import HostHistory
+from host_scheduler import HostScheduler
+from fleet_command import OutputGroups
+from progress_events import ProgressBus
+from ssh_pool import SSHConnectionPool
+from ssh_timing import TimingSSHClient, PhaseStats, connect_phases, empty_timings
+from ssh_metrics import SSHMetrics
+from ssh_resilience import (AdaptiveTimeouts, RetryPolicy, CircuitBreaker, CircuitOpenError,
+                            is_timeout_error, classify_error, ERROR_PROXY, ERROR_TIMEOUT,
+                            ERROR_CONNECTION, ERROR_CIRCUIT_OPEN, ERROR_AUTH)
+
+try:
+    import socks  # 仅旧版线程池代理路径需要 (pip install pysocks)
+except ImportError:
+    socks = None
+
+try:
+    import uvloop  # 可选的高性能事件循环 (pip install uvloop, 不支持Windows)
+except ImportError:
+    uvloop = None
+
+
+def event_loop_factory(use_uvloop: bool = False) -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """选择事件循环实现: 要求uvloop且已安装时返回uvloop工厂, 否则返回None(默认asyncio循环)"""
+    if use_uvloop and uvloop is not None:
+        return uvloop.new_event_loop
+    return None
+
+
+def run_async(coro, use_uvloop: bool = False):
+    """
+    在新建的事件循环中运行协程 (替代 asyncio.run)
+    
+    use_uvloop=True 时使用uvloop, 未安装uvloop则静默回退到默认循环
+    """
+    factory = event_loop_factory(use_uvloop)
+    if factory is None:
+        return asyncio.run(coro)
+    if hasattr(asyncio, 'Runner'):
+        with asyncio.Runner(loop_factory=factory) as runner:
+            return runner.run(coro)
+    # Python 3.10及以下没有 asyncio.Runner, 通过循环策略切换
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    try:
+        return asyncio.run(coro)
+    finally:
+        asyncio.set_event_loop_policy(None)
+
+
+# 批量结果回调: on_result(result, counters)
+ResultCallback = Callable[[Any, Dict[str, Optional[int]]], Any]
+
+
+class RaceConnectError(Exception):
+    """赛跑模式下代理和直连都失败, errors 记录每条路径的异常"""
+    
+    def __init__(self, errors: Dict[str, BaseException]):
+        super().__init__("; ".join(f"{path}: {error}" for path, error in errors.items()))
+        self.errors = errors
+
+
+class SSHConnectError(Exception):
+    """连接最终失败 (已按重试策略重试), category 为错误类别, attempts 为尝试次数"""
+    
+    def __init__(self, cause: Optional[BaseException], category: str, attempts: int,
+                 timings: Optional[Dict[str, Optional[float]]] = None):
+        super().__init__(f"SSH连接失败: {cause}")
+        self.cause = cause
+        self.category = category
+        self.attempts = attempts
+        self.timings = timings  # 最后一次尝试的分阶段耗时
 
 
 class AsyncSSHClient:
     """基于AsyncSSH的高性能SSH客户端"""
     
+    # 自动检测时扫描的常见代理端口
+    DEFAULT_PROXY_PORTS = [1080, 1081, 1082, 7890, 8080, 8888, 1087, 7891]
+    
     def __init__(self, proxy_host: Optional[str] = None, proxy_port: Optional[int] = None, 
-                 auto_detect_proxy: bool = True):
+                 auto_detect_proxy: bool = True, proxy_username: Optional[str] = None,
+                 proxy_password: Optional[str] = None, native_socks: bool = True,
+                 proxy_registry: Optional[ProxyRegistry] = None, use_proxy_cache: bool = True,
+                 proxy_ports: Optional[Iterable[int]] = None,
+                 health_probe: Optional[Callable[[str, int], Awaitable[Dict[str, Any]]]] = None,
+                 max_channels: int = 10, circuit_breaker: Optional[CircuitBreaker] = None,
+                 circuit_fallback_direct: bool = False):
         """
         初始化AsyncSSH客户端
         
@@ -33,83 +120,119 @@ class AsyncSSHClient:
             proxy_host: SOCKS代理主机 (如: '127.0.0.1')
             proxy_port: SOCKS代理端口 (如: 1081)
             auto_detect_proxy: 是否自动检测活跃代理端口
+            proxy_username: SOCKS5用户名 (无认证代理留空)
+            proxy_password: SOCKS5密码
+            native_socks: 使用原生asyncio SOCKS5客户端 (False则回退到PySocks线程池)
+            proxy_registry: 代理发现缓存 (默认使用进程共享的注册表)
+            use_proxy_cache: 是否复用缓存的代理探测结果
+            proxy_ports: 自动检测时扫描的端口 (可传入范围, 如 range(1080, 1181))
+            health_probe: 代理健康探测 async (proxy_host, proxy_port) -> {'healthy', 'latency_ms', 'error'},
+                          默认对SSH目标主机做SOCKS5握手+CONNECT (目标拒绝或超时不影响代理的健康判断)
+            max_channels: 单个连接上同时打开的会话通道上限 (OpenSSH默认MaxSessions为10)
+            circuit_breaker: 代理端口熔断器, 代理连续不可用时不再尝试
+            circuit_fallback_direct: 代理熔断时改为直连 (默认快速失败)
         """
         self.proxy_host = proxy_host or '127.0.0.1'
         self.proxy_port = proxy_port
         self.auto_detect_proxy = auto_detect_proxy
+        self.proxy_username = proxy_username
+        self.proxy_password = proxy_password
+        self.native_socks = native_socks
+        self.proxy_registry = proxy_registry or get_proxy_registry()
+        self.use_proxy_cache = use_proxy_cache
+        self.proxy_ports = list(proxy_ports) if proxy_ports is not None else list(self.DEFAULT_PROXY_PORTS)
+        self.health_probe = health_probe
         self.connection = None
         self.active_proxy_port = None
+        self._probe_target: Optional[Tuple[str, int]] = None
+        self.reused = False  # 是否为连接池复用的会话
+        self.connected_via: Optional[str] = None  # 'proxy' / 'direct'
+        self.connect_elapsed: Optional[float] = None  # SSH连接建立耗时(秒), 不含代理发现
+        self.last_error: Optional[BaseException] = None
+        self.connect_attempts = 0  # 管理器重试后成功时的尝试次数
+        self.proxy_endpoint: Optional[Tuple[str, int]] = None  # 负载均衡分配的代理 (管理器使用)
+        self.timings: Dict[str, Optional[float]] = empty_timings()  # 分阶段耗时, 见 ssh_timing
+        self._path_timings: Dict[str, Dict[str, Optional[float]]] = {}
+        self.max_channels = max_channels
+        self._channel_slots: Optional[asyncio.Semaphore] = None
+        self.circuit_breaker = circuit_breaker
+        self.circuit_fallback_direct = circuit_fallback_direct
         
-    def _detect_active_proxy_ports(self) -> List[int]:
-        """检测活跃的代理端口"""
-        common_ports = [1080, 1081, 1082, 7890, 8080, 8888, 1087, 7891]
-        active_ports = []
+    async def _detect_active_proxy_ports(self, ports: Optional[Iterable[int]] = None,
+                                         timeout: float = 1.0) -> List[int]:
+        """并发检测活跃的代理端口"""
+        active_ports = await scan_open_ports(self.proxy_host, ports or self.proxy_ports, timeout=timeout)
         
-        for port in common_ports:
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(1)
-                result = sock.connect_ex((self.proxy_host, port))
-                sock.close()
-                if result == 0:
-                    active_ports.append(port)
-                    print(f"✅ 检测到活跃代理端口: {port}")
-            except:
-                continue
+        for port in active_ports:
+            print(f"✅ 检测到活跃代理端口: {port}")
         
         return active_ports
     
-    def _test_proxy_functionality(self, port: int) -> bool:
-        """测试代理端口的实际功能"""
+    def _get_health_probe(self) -> Callable[[str, int], Awaitable[Dict[str, Any]]]:
+        """获取健康探测器 (未指定时CONNECT到当前SSH目标)"""
+        if self.health_probe:
+            return self.health_probe
+        
+        target_host, target_port = self._probe_target or (None, 22)
+        return Socks5HealthProbe(target_host, target_port,
+                                 username=self.proxy_username, password=self.proxy_password)
+    
+    async def _test_proxy_functionality(self, port: int) -> Dict[str, Any]:
+        """测试代理端口的实际功能 (SOCKS5握手 + CONNECT)"""
         try:
-            import requests
-            
-            proxies = {
-                'http': f'socks5h://{self.proxy_host}:{port}',
-                'https': f'socks5h://{self.proxy_host}:{port}'
-            }
-            
-            # 测试简单的HTTP请求
-            response = requests.get('http://httpbin.org/ip', 
-                                  proxies=proxies, 
-                                  timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                print(f"✅ 端口 {port} 代理功能正常，出口IP: {data.get('origin', 'unknown')}")
-                return True
-            else:
-                print(f"⚠️ 端口 {port} 响应异常: {response.status_code}")
-                return False
-                
+            result = await self._get_health_probe()(self.proxy_host, port)
         except Exception as e:
-            print(f"❌ 端口 {port} 代理测试失败: {e}")
-            return False
+            result = {'healthy': False, 'latency_ms': None, 'error': str(e)}
+        
+        if result['healthy']:
+            print(f"✅ 端口 {port} 代理功能正常，握手延迟: {result['latency_ms']}ms")
+        else:
+            print(f"❌ 端口 {port} 代理测试失败: {result['error']}")
+        return result
     
-    def _get_best_proxy_port(self) -> Optional[int]:
-        """获取最佳的代理端口"""
+    async def _discover_proxy(self) -> Dict[str, Any]:
+        """探测可用代理, 返回 {'port', 'latency_ms', 'candidates'}"""
         if self.proxy_port:
             # 如果指定了端口，先测试该端口
-            if self._test_proxy_functionality(self.proxy_port):
-                return self.proxy_port
+            result = await self._test_proxy_functionality(self.proxy_port)
+            if result['healthy']:
+                return {'port': self.proxy_port, 'latency_ms': result['latency_ms'],
+                        'candidates': {self.proxy_port: result['latency_ms']}}
         
         if not self.auto_detect_proxy:
-            return self.proxy_port
+            return {'port': self.proxy_port, 'latency_ms': None, 'candidates': {}}
         
         print("🔍 自动检测活跃代理端口...")
-        active_ports = self._detect_active_proxy_ports()
+        active_ports = await self._detect_active_proxy_ports()
         
         if not active_ports:
             print("❌ 未检测到活跃的代理端口")
-            return None
+            return {'port': None, 'latency_ms': None, 'candidates': {}}
         
-        # 测试每个活跃端口的代理功能
-        for port in active_ports:
-            if self._test_proxy_functionality(port):
-                return port
+        # 并发测试每个活跃端口的代理功能, 选择握手延迟最低的端口
+        results = await asyncio.gather(*(self._test_proxy_functionality(port) for port in active_ports))
+        candidates = {port: r['latency_ms'] for port, r in zip(active_ports, results) if r['healthy']}
+        
+        if not candidates:
+            print("❌ 所有检测到的端口都无法正常工作")
+            return {'port': None, 'latency_ms': None, 'candidates': {}}
         
-        print("❌ 所有检测到的端口都无法正常工作")
-        return None
+        best_port = min(candidates, key=candidates.get)
+        return {'port': best_port, 'latency_ms': candidates[best_port], 'candidates': candidates}
+    
+    async def _get_best_proxy_port(self) -> Optional[int]:
+        """获取最佳的代理端口"""
+        return (await self._discover_proxy())['port']
+    
+    def _proxy_cache_key(self) -> Tuple[str, Optional[int], bool, Tuple[int, ...]]:
+        """代理发现缓存键: 相同配置的客户端共享探测结果"""
+        return (self.proxy_host, self.proxy_port, self.auto_detect_proxy, tuple(self.proxy_ports))
+    
+    async def _resolve_proxy_port(self) -> Optional[int]:
+        """获取代理端口, 优先使用共享缓存"""
+        if not self.use_proxy_cache:
+            return await self._get_best_proxy_port()
+        return await self.proxy_registry.get_port(self._proxy_cache_key(), self._discover_proxy)
         
     async def connect(self, 
                      hostname: str, 
@@ -118,7 +241,10 @@ class AsyncSSHClient:
                      password: Optional[str] = None,
                      private_key: Optional[str] = None,
                      timeout: int = 30,
-                     use_proxy: bool = True) -> bool:
+                     use_proxy: bool = True,
+                     keepalive_interval: Optional[float] = None,
+                     race: bool = False,
+                     race_head_start: float = 1.0) -> bool:
         """
         连接到SSH服务器
         
@@ -130,10 +256,19 @@ class AsyncSSHClient:
             private_key: 私钥路径
             timeout: 连接超时时间
             use_proxy: 是否使用代理
+            keepalive_interval: SSH keepalive间隔(秒), 长期保持的连接(如连接池)使用
+            race: 代理与直连赛跑, 先完成SSH握手的一路胜出 (需要 use_proxy=True)
+            race_head_start: 赛跑模式下代理连接领先直连的时间(秒)
             
         Returns:
-            bool: 连接是否成功
+            bool: 连接是否成功, 成功后 connected_via 记录实际使用的路径 ('proxy' / 'direct')
         """
+        self.connected_via = None
+        self.connect_elapsed = None
+        self.last_error = None
+        self.timings = empty_timings()
+        self._path_timings = {}
+        
         try:
             # 构建连接参数
             connect_kwargs = {
@@ -143,6 +278,9 @@ class AsyncSSHClient:
                 'known_hosts': None,  # 忽略主机密钥验证
                 'connect_timeout': timeout,
             }
+            if keepalive_interval:
+                connect_kwargs['keepalive_interval'] = keepalive_interval
+                connect_kwargs['keepalive_count_max'] = 3
             
             # 添加认证信息
             if password:
@@ -152,12 +290,22 @@ class AsyncSSHClient:
             
             # 代理连接逻辑
             if use_proxy:
-                self.active_proxy_port = self._get_best_proxy_port()
+                self._probe_target = (hostname, port)
+                select_start = time.monotonic()
+                self.active_proxy_port = await self._resolve_proxy_port()
+                self.timings['proxy_select'] = time.monotonic() - select_start
                 
-                if self.active_proxy_port:
+                if self.active_proxy_port and not self._proxy_circuit_allows():
+                    # 代理已熔断: 重新探测代理, 本次改走直连或快速失败
+                    if self.use_proxy_cache:
+                        self.proxy_registry.invalidate(self._proxy_cache_key())
+                    if not (race or self.circuit_fallback_direct):
+                        raise CircuitOpenError(f"代理 {self.proxy_host}:{self.active_proxy_port} 已熔断")
+                    print(f"⚡ 代理 {self.proxy_host}:{self.active_proxy_port} 已熔断，切换到直连模式")
+                    self.active_proxy_port = None
+                    use_proxy = False
+                elif self.active_proxy_port:
                     print(f"🌐 使用代理连接: {self.proxy_host}:{self.active_proxy_port}")
-                    # 使用自定义的代理连接工厂
-                    connect_kwargs['sock'] = await self._create_proxy_socket(hostname, port, timeout)
                 else:
                     print("⚠️ 未找到可用代理，切换到直连模式")
                     use_proxy = False
@@ -166,24 +314,139 @@ class AsyncSSHClient:
                 print("🔗 使用直连模式")
             
             # 建立连接
-            self.connection = await asyncssh.connect(**connect_kwargs)
+            connect_start = time.monotonic()
+            if use_proxy and race:
+                print(f"🏁 代理/直连赛跑模式 (代理领先 {race_head_start}s)")
+                self.connection, self.connected_via = await self._race_connect(connect_kwargs, race_head_start)
+            else:
+                self.connection = await self._open_ssh(connect_kwargs, via_proxy=use_proxy)
+                self.connected_via = 'proxy' if use_proxy else 'direct'
             
-            connection_mode = f"代理模式 ({self.proxy_host}:{self.active_proxy_port})" if use_proxy else "直连模式"
+            self.connect_elapsed = time.monotonic() - connect_start
+            self.timings.update(self._path_timings.get(self.connected_via, {}))
+            if self.connected_via == 'direct':
+                self.active_proxy_port = None
+            elif self.circuit_breaker:
+                self.circuit_breaker.record_success(self._proxy_circuit_key())
+            
+            connection_mode = f"代理模式 ({self.proxy_host}:{self.active_proxy_port})" if self.active_proxy_port else "直连模式"
             print(f"✅ SSH连接成功 - {connection_mode}")
             return True
             
         except Exception as e:
+            self.last_error = e
+            # 赛跑模式下各路径的错误已在 _race_connect 中分别处理
+            self._on_proxy_error(e, via_proxy=use_proxy and not race)
+            if len(self._path_timings) == 1:
+                self.timings.update(next(iter(self._path_timings.values())))
             print(f"❌ SSH连接失败: {e}")
             return False
     
+    def _proxy_circuit_key(self) -> Tuple[str, str, Optional[int]]:
+        return ('proxy', self.proxy_host, self.active_proxy_port)
+    
+    def _proxy_circuit_allows(self) -> bool:
+        return self.circuit_breaker is None or self.circuit_breaker.allow(self._proxy_circuit_key())
+    
+    def _on_proxy_error(self, error: BaseException, via_proxy: bool = True):
+        """
+        代理本身不可达时使缓存失效 (下一次连接重新探测), 并计入代理熔断器;
+        代理已应答 (CONNECT被拒绝, 或隧道建立后目标一侧的SSH错误) 时代理本身正常, 计为代理成功
+        """
+        if isinstance(error, ProxyUnreachableError) and self.use_proxy_cache:
+            self.proxy_registry.invalidate(self._proxy_cache_key())
+        if not (self.circuit_breaker and self.active_proxy_port and via_proxy):
+            return
+        if classify_error(error) == ERROR_PROXY:
+            self.circuit_breaker.record_failure(self._proxy_circuit_key())
+        elif isinstance(error, (Socks5ConnectError, asyncssh.Error)):
+            self.circuit_breaker.record_success(self._proxy_circuit_key())
+    
+    async def _open_ssh(self, connect_kwargs: Dict[str, Any], via_proxy: bool):
+        """按指定路径建立SSH连接, 分阶段耗时记录到 _path_timings['proxy' / 'direct']"""
+        marks = {'start': time.monotonic()}
+        path = 'proxy' if via_proxy else 'direct'
+        connect_kwargs = dict(connect_kwargs)
+        connect_kwargs['client_factory'] = lambda: TimingSSHClient(marks)
+        if via_proxy:
+            if self.native_socks:
+                # 原生SOCKS5隧道, 握手完成后asyncssh直接接管transport
+                connect_kwargs['tunnel'] = Socks5Tunnel(
+                    self.proxy_host, self.active_proxy_port,
+                    self.proxy_username, self.proxy_password, connect_kwargs['connect_timeout']
+                )
+            else:
+                connect_kwargs['sock'] = await self._create_proxy_socket(
+                    connect_kwargs['host'], connect_kwargs['port'], connect_kwargs['connect_timeout'])
+        
+        try:
+            return await asyncssh.connect(**connect_kwargs)
+        finally:
+            self._path_timings[path] = connect_phases(marks, via_proxy)
+    
+    async def _race_connect(self, connect_kwargs: Dict[str, Any], head_start: float):
+        """
+        代理先行, head_start秒后(或代理提前失败时)启动直连, 取先完成握手的连接, 取消落败方
+        
+        Returns:
+            Tuple[connection, 'proxy' | 'direct']
+        """
+        attempts = {asyncio.create_task(self._open_ssh(connect_kwargs, via_proxy=True)): 'proxy'}
+        errors = {}
+        winner = None
+        
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=head_start)
+            for task in done:
+                if task.exception() is None:
+                    winner = task
+                else:
+                    errors['proxy'] = task.exception()
+                    self._on_proxy_error(task.exception(), via_proxy=True)
+                    del attempts[task]
+            
+            if winner is None:
+                attempts[asyncio.create_task(self._open_ssh(connect_kwargs, via_proxy=False))] = 'direct'
+            
+            pending = set(attempts)
+            while winner is None and pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = winner or task
+                    else:
+                        errors[attempts[task]] = task.exception()
+                        self._on_proxy_error(task.exception(), via_proxy=attempts[task] == 'proxy')
+        finally:
+            losers = [task for task in attempts if task is not winner]
+            for task in losers:
+                task.cancel()
+            for task in losers:
+                try:
+                    loser_connection = await task
+                except BaseException:
+                    continue
+                # 双方几乎同时完成握手, 关闭多余的连接
+                loser_connection.close()
+        
+        if winner is None:
+            raise RaceConnectError(errors)
+        
+        print(f"🏆 {'代理' if attempts[winner] == 'proxy' else '直连'}路径先完成握手")
+        return winner.result(), attempts[winner]
+    
     async def _create_proxy_socket(self, target_host: str, target_port: int, timeout: int):
-        """创建代理socket连接"""
+        """创建代理socket连接 (旧版PySocks线程池路径)"""
+        if socks is None:
+            raise Exception("SOCKS代理连接失败: 未安装PySocks, 请使用 native_socks=True")
+        
         try:
             # 在执行器中创建SOCKS连接
             def create_socks_connection():
                 # 创建SOCKS socket
                 sock = socks.socksocket()
-                sock.set_proxy(socks.SOCKS5, self.proxy_host, self.active_proxy_port)
+                sock.set_proxy(socks.SOCKS5, self.proxy_host, self.active_proxy_port,
+                               username=self.proxy_username, password=self.proxy_password)
                 sock.settimeout(timeout)
                 
                 # 连接到目标主机
@@ -199,6 +462,12 @@ class AsyncSSHClient:
         except Exception as e:
             raise Exception(f"SOCKS代理连接失败: {e}")
     
+    def _get_channel_slots(self) -> asyncio.Semaphore:
+        """单连接通道数限制"""
+        if self._channel_slots is None:
+            self._channel_slots = asyncio.Semaphore(self.max_channels)
+        return self._channel_slots
+    
     async def execute_command(self, command: str, timeout: int = 30) -> Tuple[str, str, int]:
         """
         执行SSH命令
@@ -213,24 +482,70 @@ class AsyncSSHClient:
         if not self.connection:
             raise Exception("SSH连接未建立")
         
-        try:
-            result = await asyncio.wait_for(
-                self.connection.run(command, check=False),
-                timeout=timeout
-            )
-            
-            return (
-                result.stdout or '',
-                result.stderr or '',
-                result.exit_status
-            )
-            
-        except asyncio.TimeoutError:
-            raise Exception(f"命令执行超时: {command}")
-        except Exception as e:
-            raise Exception(f"命令执行失败: {e}")
+        async with self._get_channel_slots():
+            try:
+                result = await asyncio.wait_for(
+                    self.connection.run(command, check=False),
+                    timeout=timeout
+                )
+                
+                return (
+                    result.stdout or '',
+                    result.stderr or '',
+                    result.exit_status
+                )
+                
+            except asyncio.TimeoutError:
+                raise Exception(f"命令执行超时: {command}")
+            except Exception as e:
+                raise Exception(f"命令执行失败: {e}")
     
-    async def test_connection(self) -> Dict[str, Any]:
+    async def execute_commands(self, commands: List[str], timeout: int = 30,
+                               return_exceptions: bool = False) -> List[Union[Tuple[str, str, int], Exception]]:
+        """
+        在同一连接上并发执行多条命令 (每条命令一个独立通道)
+        
+        同时打开的通道数受 max_channels 限制, 多步检查的耗时从 N×RTT 降到约 1×RTT
+        
+        Args:
+            commands: 命令列表
+            timeout: 单条命令的执行超时时间
+            return_exceptions: True时失败的命令以异常对象返回, 否则抛出第一个异常
+            
+        Returns:
+            List[Tuple[stdout, stderr, exit_code]]: 与提交顺序一致
+        """
+        return await asyncio.gather(
+            *(self.execute_command(command, timeout=timeout) for command in commands),
+            return_exceptions=return_exceptions
+        )
+    
+    def stream_command(self, command: str, timeout: Optional[float] = None, lines: bool = True,
+                       chunk_size: int = 8192, max_buffer: int = 256 * 1024,
+                       spill_path: Optional[str] = None) -> 'CommandStream':
+        """
+        流式执行SSH命令, 输出边产生边返回, 内存占用与输出总量无关
+        
+        用法:
+            stream = client.stream_command('bash xrayL.sh')
+            async for name, data in stream:   # name 为 'stdout' 或 'stderr'
+                ...
+            print(stream.exit_code)
+        
+        Args:
+            command: 要执行的命令
+            timeout: 整体执行超时时间 (None为不限制)
+            lines: True按行返回, False按数据块返回
+            chunk_size: 每次读取的最大字节数, 也是单行的最大长度 (超长行会被拆分)
+            max_buffer: 尚未被消费的输出上限(字节), 超过后暂停读取, 由SSH流控反压远端
+            spill_path: 同时把完整输出追加写入该文件, 便于事后查看全部日志
+        """
+        if not self.connection:
+            raise Exception("SSH连接未建立")
+        
+        return CommandStream(self, command, timeout, lines, chunk_size, max_buffer, spill_path)
+    
+    async def test_connection(self, timeout: float = 10) -> Dict[str, Any]:
         """测试SSH连接状态"""
         if not self.connection:
             return {
@@ -241,7 +556,7 @@ class AsyncSSHClient:
         try:
             # 执行简单的测试命令
             start_time = time.time()
-            stdout, stderr, exit_code = await self.execute_command('echo "test"', timeout=10)
+            stdout, stderr, exit_code = await self.execute_command('echo "test"', timeout=timeout)
             response_time = time.time() - start_time
             
             return {
@@ -250,6 +565,7 @@ class AsyncSSHClient:
                 'test_output': stdout.strip(),
                 'exit_code': exit_code,
                 'proxy_port': self.active_proxy_port,
+                'connected_via': self.connected_via,
                 'connection_mode': f"代理模式 ({self.proxy_host}:{self.active_proxy_port})" if self.active_proxy_port else "直连模式"
             }
             
@@ -275,102 +591,1018 @@ class AsyncSSHClient:
         await self.close()
 
 
+class CommandStream:
+    """流式命令输出 (由 AsyncSSHClient.stream_command 创建)"""
+    
+    def __init__(self, client: AsyncSSHClient, command: str, timeout: Optional[float], lines: bool,
+                 chunk_size: int, max_buffer: int, spill_path: Optional[str]):
+        self.client = client
+        self.command = command
+        self.timeout = timeout
+        self.lines = lines
+        self.chunk_size = chunk_size
+        self.max_buffer = max_buffer
+        self.spill_path = spill_path
+        self.exit_code: Optional[int] = None
+        self.exit_signal = None
+        # 已放入队列但尚未被消费的输出字节数
+        self._buffered = 0
+        self._drained: Optional[asyncio.Event] = None
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    @staticmethod
+    def _size(data: str) -> int:
+        return len(data.encode('utf-8', 'surrogateescape'))
+    
+    async def _put(self, queue: asyncio.Queue, name: str, data: str):
+        """未消费的输出超过 max_buffer 字节时等待消费方取走 (不再读取即形成反压)"""
+        size = self._size(data)
+        while self._buffered and self._buffered + size > self.max_buffer:
+            self._drained.clear()
+            await self._drained.wait()
+        self._buffered += size
+        queue.put_nowait((name, data))
+    
+    async def _pump(self, name: str, reader, queue: asyncio.Queue):
+        """读取一路输出放入队列, 按字节数限制未消费的输出"""
+        try:
+            pending = ''
+            while True:
+                data = await reader.read(self.chunk_size)
+                if not data:
+                    break
+                if not self.lines:
+                    await self._put(queue, name, data)
+                    continue
+                
+                pending += data
+                *complete, pending = pending.split('\n')
+                for line in complete:
+                    await self._put(queue, name, line + '\n')
+                while len(pending) >= self.chunk_size:
+                    await self._put(queue, name, pending[:self.chunk_size])
+                    pending = pending[self.chunk_size:]
+            
+            if pending:
+                await self._put(queue, name, pending)
+            queue.put_nowait((name, None))
+        except Exception as e:
+            queue.put_nowait((name, e))
+    
+    async def _iterate(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout if self.timeout else None
+        # 队列本身不限长度, 未消费的输出由 _put 按字节数限制
+        queue = asyncio.Queue()
+        self._buffered = 0
+        self._drained = asyncio.Event()
+        
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - loop.time())
+        
+        async with self.client._get_channel_slots():
+            process = await self.client.connection.create_process(self.command)
+            pumps = [asyncio.create_task(self._pump('stdout', process.stdout, queue)),
+                     asyncio.create_task(self._pump('stderr', process.stderr, queue))]
+            spill = open(self.spill_path, 'a', encoding='utf-8') if self.spill_path else None
+            
+            try:
+                finished = 0
+                while finished < len(pumps):
+                    name, data = await asyncio.wait_for(queue.get(), remaining())
+                    if data is None:
+                        finished += 1
+                        continue
+                    if isinstance(data, Exception):
+                        raise Exception(f"命令执行失败: {data}")
+                    self._buffered -= self._size(data)
+                    self._drained.set()
+                    if spill:
+                        spill.write(data)
+                    yield name, data
+                
+                await asyncio.wait_for(process.wait_closed(), remaining())
+                self.exit_code = process.exit_status
+                self.exit_signal = process.exit_signal
+            except asyncio.TimeoutError:
+                raise Exception(f"命令执行超时: {self.command}")
+            finally:
+                for pump in pumps:
+                    pump.cancel()
+                if process.exit_status is None:
+                    process.close()
+                if spill:
+                    spill.close()
+
+
 class AsyncSSHManager:
     """AsyncSSH批量管理器"""
     
+    # 批量截止时间前剩余不足该时间(秒)时不再开始检测新主机 (有历史耗时的主机按历史耗时判断)
+    DEADLINE_MIN_BUDGET = 0.5
+    
     def __init__(self, proxy_host: Optional[str] = None, proxy_port: Optional[int] = None,
-                 auto_detect_proxy: bool = True):
+                 auto_detect_proxy: bool = True, proxy_registry: Optional[ProxyRegistry] = None,
+                 proxy_ports: Optional[Iterable[int]] = None,
+                 health_probe: Optional[Callable[[str, int], Awaitable[Dict[str, Any]]]] = None,
+                 pool: Optional[SSHConnectionPool] = None, use_pool: bool = True,
+                 race_connect: bool = False, race_head_start: float = 1.0,
+                 adaptive_timeouts: Optional[AdaptiveTimeouts] = None, use_adaptive_timeouts: bool = True,
+                 retry_policy: Optional[RetryPolicy] = None, circuit_breaker: Optional[CircuitBreaker] = None,
+                 circuit_fallback_direct: bool = False,
+                 proxy_endpoints: Union[None, str, Iterable[Union[int, Tuple[str, int]]]] = None,
+                 balance_policy: str = ProxyBalancer.LEAST_OUTSTANDING, max_per_proxy: Optional[int] = None,
+                 use_uvloop: bool = False, history: Union[None, str, HostHistory] = None,
+                 metrics: Optional[SSHMetrics] = None, scheduler: Optional[HostScheduler] = None):
+        """
+        Args:
+            pool: SSH连接池 (默认自动创建); execute_on_vps 等单台操作复用已认证会话。
+                  批量操作 (test_multiple_vps / iter_test / recheck_vps / run_on_fleet) 默认用完即关闭
+                  新建的连接, 传入 keep_connections=True 时才留给随后的部署/命令执行复用
+            use_pool: False时每次操作都新建并关闭连接
+            race_connect: 代理与直连赛跑, 适合部分主机只能直连、部分只能走代理的批量任务
+            race_head_start: 赛跑模式下代理连接领先直连的时间(秒)
+            adaptive_timeouts: 按主机/代理历史耗时推导的超时 (默认自动创建)
+            use_adaptive_timeouts: False时使用固定超时 (连接30s, 探测命令10s)
+            retry_policy: 连接重试策略 (默认最多3次, 认证失败不重试; RetryPolicy(max_attempts=1)关闭重试)
+            circuit_breaker: 按代理端口和目标主机熔断 (默认连续5次失败后熔断30秒)
+            circuit_fallback_direct: 代理熔断后剩余主机改为直连, 否则快速失败
+            proxy_endpoints: 多个本地代理端口 (端口或(host, port)), 连接在其间负载均衡;
+                             'auto' 表示使用自动检测到的全部可用端口
+            balance_policy: round_robin / least_outstanding / lowest_latency
+            max_per_proxy: 每个代理同时建立中/使用中的连接上限
+            use_uvloop: 管理器自建事件循环时 (run_sync / 多进程分片) 使用uvloop, 未安装时回退默认循环
+            history: 健康历史库 (SQLite文件路径或HostHistory), 批量检测结果自动批量写入
+            metrics: 指标集合 (OpenMetrics导出), 不传时不做统计
+            scheduler: schedule=True 时使用的调度器 (默认按 history / 自适应超时 / 熔断器自动创建)
+        """
         self.proxy_host = proxy_host or '127.0.0.1'
         self.proxy_port = proxy_port
         self.auto_detect_proxy = auto_detect_proxy
+        self.proxy_ports = list(proxy_ports) if proxy_ports is not None else None
+        self.health_probe = health_probe
+        # 所有批量任务共享同一份代理探测结果
+        self.proxy_registry = proxy_registry or get_proxy_registry()
+        self.pool = pool or (SSHConnectionPool() if use_pool else None)
+        self.race_connect = race_connect
+        self.race_head_start = race_head_start
+        self.timeouts = adaptive_timeouts or (AdaptiveTimeouts() if use_adaptive_timeouts else None)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.circuit_fallback_direct = circuit_fallback_direct
+        self.balance_policy = balance_policy
+        self.max_per_proxy = max_per_proxy
+        self.auto_balance = proxy_endpoints == 'auto'
+        self.balancer: Optional[ProxyBalancer] = None
+        if proxy_endpoints and not self.auto_balance:
+            self.balancer = self._create_balancer(proxy_endpoints)
+        self.use_uvloop = use_uvloop
+        self.history = HostHistory(history) if isinstance(history, str) else history
+        self.metrics = metrics
+        self.scheduler = scheduler
+    
+    def _create_balancer(self, endpoints) -> ProxyBalancer:
+        return ProxyBalancer(endpoints, policy=self.balance_policy, max_per_proxy=self.max_per_proxy,
+                             proxy_host=self.proxy_host, circuit_breaker=self.circuit_breaker)
+    
+    async def _ensure_balancer(self):
+        """proxy_endpoints='auto' 时, 用代理探测结果中的全部健康端口创建负载均衡器"""
+        if not self.auto_balance or self.balancer is not None:
+            return
+        
+        client = self._new_client()
+        info = await self.proxy_registry.lookup(client._proxy_cache_key(), client._discover_proxy)
+        if info.get('candidates') and self.balancer is None:
+            self.balancer = self._create_balancer(sorted(info['candidates']))
+            print(f"⚖️ 在 {len(self.balancer.endpoints)} 个代理端口间负载均衡 ({self.balance_policy})")
+    
+    def _new_client(self, endpoint: Optional[Tuple[str, int]] = None) -> AsyncSSHClient:
+        """按管理器配置创建客户端 (endpoint为负载均衡分配的代理)"""
+        return AsyncSSHClient(
+            proxy_host=endpoint[0] if endpoint else self.proxy_host,
+            proxy_port=endpoint[1] if endpoint else self.proxy_port,
+            auto_detect_proxy=self.auto_detect_proxy if endpoint is None else False,
+            proxy_registry=self.proxy_registry,
+            proxy_ports=self.proxy_ports,
+            health_probe=self.health_probe,
+            circuit_breaker=self.circuit_breaker,
+            circuit_fallback_direct=self.circuit_fallback_direct
+        )
     
-    async def test_multiple_vps(self, vps_list: list, max_concurrent: int = 10, 
-                               use_proxy: bool = True) -> Dict[str, Any]:
+    def _pool_key(self, vps_info: Dict[str, Any], use_proxy: bool) -> Tuple:
+        """连接池键: (ip, port, username, proxy)"""
+        return (vps_info.get('ip'), vps_info.get('port', 22), vps_info.get('username', 'root'),
+                self._path_key(use_proxy))
+    
+    def _path_key(self, use_proxy: bool):
+        """连接路径: 代理 (host, port), 负载均衡时为 ('balanced', host), 直连为None"""
+        if not use_proxy:
+            return None
+        if self.balancer is not None or self.auto_balance:
+            return ('balanced', self.proxy_host)
+        return (self.proxy_host, self.proxy_port)
+    
+    @staticmethod
+    def _host_key(vps_info: Dict[str, Any]) -> Tuple[Any, Any]:
+        return (vps_info.get('ip'), vps_info.get('port', 22))
+    
+    def _connect_timeout(self, vps_info: Dict[str, Any], path) -> float:
+        if self.timeouts is None:
+            return 30
+        return self.timeouts.connect_timeout(self._host_key(vps_info), path)
+    
+    def _command_timeout(self, vps_info: Dict[str, Any]) -> float:
+        if self.timeouts is None:
+            return 10
+        return self.timeouts.command_timeout(self._host_key(vps_info))
+    
+    @staticmethod
+    def _within_deadline(timeout: float, deadline_at: Optional[float]) -> float:
+        """距批量截止时间不足timeout时缩短超时 (deadline_at为time.monotonic()时间点)"""
+        if deadline_at is None:
+            return timeout
+        return max(0.0, min(timeout, deadline_at - time.monotonic()))
+    
+    def _expected_cost(self, vps_info: Dict[str, Any]) -> float:
+        """检测一台主机预计需要的时间(秒), 截止时间前剩余时间不足时不再开始"""
+        if self.timeouts is not None:
+            snapshot = self.timeouts.snapshot(self._host_key(vps_info))
+            if snapshot['connect_srtt'] is not None:
+                expected = snapshot['connect_srtt'] + (snapshot['command_srtt'] or 0.0)
+                return max(self.DEADLINE_MIN_BUDGET, expected)
+        return self.DEADLINE_MIN_BUDGET
+    
+    async def _open_client(self, vps_info: Dict[str, Any], use_proxy: bool,
+                           timeout: Optional[float] = None,
+                           deadline_at: Optional[float] = None) -> AsyncSSHClient:
+        """
+        新建并连接客户端 (timeout为None时使用自适应超时)
+        
+        超时/连接重置按重试策略退避重试, 认证失败立即放弃;
+        有批量截止时间(deadline_at)时每次尝试的超时不超过剩余时间, 来不及重试时直接放弃;
+        最终失败抛出 SSHConnectError
+        """
+        host_key = self._host_key(vps_info)
+        target_circuit = ('target',) + host_key
+        attempt = 0
+        if use_proxy:
+            await self._ensure_balancer()
+        
+        while True:
+            attempt += 1
+            if not self.circuit_breaker.allow(target_circuit):
+                raise SSHConnectError(CircuitOpenError(f"目标 {host_key[0]}:{host_key[1]} 已熔断"),
+                                      ERROR_CIRCUIT_OPEN, attempt - 1)
+            
+            # 负载均衡: 每次尝试重新分配代理, 重试时可绕开故障代理
+            select_start = time.monotonic()
+            endpoint = await self.balancer.acquire() if use_proxy and self.balancer else None
+            client = self._new_client(endpoint)
+            path = endpoint or self._path_key(use_proxy)
+            resolved = path is not None and path[1] is None
+            if resolved:
+                # 自动检测的代理: 先选定端口 (共享缓存, 连接时不再重复探测), 超时按实际代理端口学习
+                proxy_port = await client._resolve_proxy_port()
+                path = (client.proxy_host, proxy_port) if proxy_port else None
+            select_elapsed = time.monotonic() - select_start
+            if self.metrics is not None:
+                self.metrics.connect_attempts.inc(path='proxy' if use_proxy else 'direct')
+            
+            try:
+                connected = await client.connect(
+                    hostname=vps_info.get('ip'),
+                    port=vps_info.get('port', 22),
+                    username=vps_info.get('username', 'root'),
+                    password=vps_info.get('password'),
+                    timeout=self._within_deadline(
+                        timeout if timeout is not None else self._connect_timeout(vps_info, path), deadline_at
+                    ),
+                    use_proxy=use_proxy,
+                    keepalive_interval=self.pool.keepalive_interval if self.pool else None,
+                    race=self.race_connect,
+                    race_head_start=self.race_head_start
+                )
+            except BaseException:
+                if endpoint:
+                    await self.balancer.release(endpoint)
+                raise
+            
+            if endpoint or resolved:
+                client.timings['proxy_select'] = (client.timings['proxy_select'] or 0.0) + select_elapsed
+            
+            if connected:
+                self.circuit_breaker.record_success(target_circuit)
+                if client.connected_via != 'proxy':
+                    path = None
+                elif resolved:
+                    path = (client.proxy_host, client.active_proxy_port)
+                if endpoint and client.connected_via == 'proxy':
+                    # 名额保留到连接使用结束 (见 _client_for)
+                    self.balancer.record_latency(endpoint, client.connect_elapsed)
+                    client.proxy_endpoint = endpoint
+                elif endpoint:
+                    await self.balancer.release(endpoint)
+                if self.timeouts is not None:
+                    self.timeouts.record_connect(host_key, path, client.connect_elapsed)
+                if self.metrics is not None:
+                    self.metrics.connect_success.inc(path=client.connected_via)
+                    proxy = f"{client.proxy_host}:{client.active_proxy_port}" if client.active_proxy_port else 'direct'
+                    self.metrics.connect_duration.observe(client.connect_elapsed, proxy=proxy)
+                client.connect_attempts = attempt
+                return client
+            
+            if endpoint:
+                await self.balancer.release(endpoint)
+            
+            error = client.last_error
+            category = classify_error(error)
+            await client.close()
+            
+            if category in (ERROR_TIMEOUT, ERROR_CONNECTION):
+                self.circuit_breaker.record_failure(target_circuit)
+            elif category == ERROR_AUTH:
+                # 认证失败说明目标可达, 结束目标熔断的试探
+                self.circuit_breaker.record_success(target_circuit)
+            else:
+                # 代理故障等与目标无关的失败, 让出试探名额
+                self.circuit_breaker.release_trial(target_circuit)
+            if category == ERROR_TIMEOUT and self.timeouts is not None:
+                self.timeouts.record_connect_timeout(host_key)
+            if self.metrics is not None:
+                self.metrics.connect_failures.inc(category=category)
+                if category == ERROR_TIMEOUT:
+                    self.metrics.timeouts.inc(kind='connect')
+            
+            delay = self.retry_policy.backoff(attempt)
+            if not self.retry_policy.should_retry(category, attempt) or \
+                    (deadline_at is not None and time.monotonic() + delay >= deadline_at):
+                raise SSHConnectError(error, category, attempt, timings=client.timings)
+            
+            print(f"🔁 {host_key[0]}:{host_key[1]} 第{attempt}次连接失败({category})，{delay:.1f}s后重试")
+            await asyncio.sleep(delay)
+    
+    @asynccontextmanager
+    async def _client_for(self, vps_info: Dict[str, Any], use_proxy: bool = True,
+                          timeout: Optional[float] = None, deadline_at: Optional[float] = None,
+                          keep: bool = True):
+        """
+        获取到指定VPS的已连接客户端, 优先从连接池复用 (连接失败抛出 SSHConnectError)
+        keep=False 时新建的连接用完即关闭, 不留在连接池中
+        """
+        connect = lambda: self._open_client(vps_info, use_proxy, timeout, deadline_at)
+        if self.metrics is not None:
+            self.metrics.in_flight.inc()
+        
+        try:
+            if self.pool is None:
+                client = await connect()
+                try:
+                    yield client
+                finally:
+                    await self._release_proxy(client)
+                    await client.close()
+                return
+            
+            async with self.pool.connection(self._pool_key(vps_info, use_proxy), connect, keep=keep) as client:
+                if client.reused and client.proxy_endpoint and self.balancer:
+                    self.balancer.track(client.proxy_endpoint)
+                try:
+                    yield client
+                finally:
+                    await self._release_proxy(client)
+        finally:
+            if self.metrics is not None:
+                self.metrics.in_flight.dec()
+    
+    async def _release_proxy(self, client: AsyncSSHClient):
+        """连接使用结束, 归还负载均衡名额"""
+        if client.proxy_endpoint and self.balancer:
+            await self.balancer.release(client.proxy_endpoint)
+    
+    async def execute_on_vps(self, vps_info: Dict[str, Any], command: str, timeout: int = 30,
+                             use_proxy: bool = True) -> Dict[str, Any]:
+        """
+        在单个VPS上执行命令 (复用连接池中的会话)
+        
+        Returns:
+            Dict: {'vps_info', 'success', 'stdout', 'stderr', 'exit_code', 'error', 'reused_connection'}
+        """
+        return await self._execute_on_vps(vps_info, command, timeout, use_proxy)
+    
+    async def _execute_on_vps(self, vps_info: Dict[str, Any], command: str, timeout: float,
+                              use_proxy: bool, deadline_at: Optional[float] = None,
+                              keep_connection: bool = True) -> Dict[str, Any]:
+        try:
+            async with self._client_for(vps_info, use_proxy, deadline_at=deadline_at,
+                                        keep=keep_connection) as client:
+                command_start = time.monotonic()
+                stdout, stderr, exit_code = await client.execute_command(
+                    command, timeout=self._within_deadline(timeout, deadline_at)
+                )
+                if self.metrics is not None:
+                    self.metrics.command_duration.observe(time.monotonic() - command_start, kind='exec')
+                return {
+                    'vps_info': vps_info,
+                    'success': exit_code == 0,
+                    'stdout': stdout,
+                    'stderr': stderr,
+                    'exit_code': exit_code,
+                    'error': None,
+                    'reused_connection': client.reused
+                }
+        except Exception as e:
+            return {'vps_info': vps_info, 'success': False, 'error': str(e),
+                    'error_category': getattr(e, 'category', classify_error(e))}
+    
+    async def execute_many_on_vps(self, vps_info: Dict[str, Any], commands: List[str], timeout: int = 30,
+                                  use_proxy: bool = True) -> Dict[str, Any]:
+        """
+        在单个VPS上并发执行多条命令 (共用一个连接, 每条命令一个通道)
+        
+        Returns:
+            Dict: {'vps_info', 'success', 'results': [{'command', 'stdout', 'stderr', 'exit_code', 'error'}], 'error'}
+        """
+        try:
+            async with self._client_for(vps_info, use_proxy) as client:
+                outputs = await client.execute_commands(commands, timeout=timeout, return_exceptions=True)
+        except Exception as e:
+            return {'vps_info': vps_info, 'success': False, 'results': [], 'error': str(e)}
+        
+        results = []
+        for command, output in zip(commands, outputs):
+            if isinstance(output, BaseException):
+                results.append({'command': command, 'stdout': '', 'stderr': '', 'exit_code': None,
+                                'error': str(output)})
+            else:
+                stdout, stderr, exit_code = output
+                results.append({'command': command, 'stdout': stdout, 'stderr': stderr,
+                                'exit_code': exit_code, 'error': None})
+        
+        return {
+            'vps_info': vps_info,
+            'success': all(r['exit_code'] == 0 for r in results),
+            'results': results,
+            'error': None
+        }
+    
+    async def stream_on_vps(self, vps_info: Dict[str, Any], command: str, timeout: Optional[float] = None,
+                            use_proxy: bool = True, **stream_options):
+        """
+        在单个VPS上流式执行命令 (异步生成器, 产出 (stdout/stderr, 数据))
+        
+        连接失败时抛出异常; stream_options 同 AsyncSSHClient.stream_command
+        """
+        async with self._client_for(vps_info, use_proxy) as client:
+            async for item in client.stream_command(command, timeout=timeout, **stream_options):
+                yield item
+    
+    async def close(self):
+        """关闭连接池中的所有连接"""
+        if self.pool:
+            await self.pool.close()
+    
+    def run_sync(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        在管理器自建的事件循环中运行批量任务 (供GUI线程等同步调用方使用), 结束后关闭连接池
+        
+        用法:
+            manager.run_sync(manager.test_multiple_vps, vps_list, max_concurrent=50)
+        """
+        async def runner():
+            async with self:
+                return await func(*args, **kwargs)
+        
+        return run_async(runner(), use_uvloop=self.use_uvloop)
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+    
+    async def test_multiple_vps(self, vps_list: Iterable[Dict[str, Any]], max_concurrent: int = 10, 
+                               use_proxy: bool = True, keep_results: bool = True,
+                               on_result: Optional[ResultCallback] = None,
+                               journal: Union[None, str, BatchJournal] = None,
+                               resume: bool = False,
+                               cancel_token: Optional[CancelToken] = None,
+                               schedule: bool = False, deadline: Optional[float] = None,
+                               progress: Optional[ProgressBus] = None,
+                               keep_connections: bool = False) -> Dict[str, Any]:
         """
         批量测试多个VPS连接
         
+        固定数量的worker按需从vps_list中取主机, 同时存在的任务数不超过max_concurrent
+        
         Args:
-            vps_list: VPS信息列表
+            vps_list: VPS信息列表, 也可以是迭代器/异步迭代器 (如逐行读取的大型清单)
             max_concurrent: 最大并发数
             use_proxy: 是否使用代理
+            keep_results: 是否保留逐台结果; 超大批量只需统计时可设为False
+            on_result: 每台主机完成时的回调, 见 iter_test
+            journal: 断点续跑日志 (文件路径或BatchJournal), 每台主机完成后追加记录
+            resume: 跳过日志中已有新鲜结果的主机, 直接复用其结果 (标记 resumed=True)
+            cancel_token: 取消令牌 ("停止检测"), 取消后返回已完成的部分结果
+            schedule: 按预期耗时调度检测顺序 (见 host_scheduler): 已知正常的快主机先测, 疑似离线的主机
+                      放到最后并先做廉价的可达性探测; 结果仍按输入顺序返回
+            deadline: 整批检测的时间预算(秒), 如 60 表示"60秒内尽力而为": 单台主机的超时随剩余时间缩短,
+                      来不及完成的主机不再开始 (结果带 not_attempted=True), 到截止时间仍未完成的主机
+                      被中断 (结果带 timed_out=True); 这两类结果不写入断点日志和健康历史
+            progress: 进度事件总线, 逐台事件合并为限频快照推送给界面 (见 progress_events)
+            keep_connections: 检测后把新建的连接留在连接池中, 供随后的部署/命令执行复用;
+                              默认检测完即关闭 (空闲连接总数另受连接池 max_idle 限制)
             
         Returns:
-            Dict: 测试结果
+            Dict: 测试结果 (results 按输入顺序排列, phase_stats 为本次检测各阶段耗时汇总);
+                  被取消时 cancelled=True, 中断的主机结果带 cancelled=True;
+                  not_attempted 为未开始的主机数, timed_out 为被截止时间中断的主机数
         """
-        semaphore = asyncio.Semaphore(max_concurrent)
-        tasks = []
+        results = {}
+        order, probe_first = None, None
+        if schedule:
+            vps_list = list(vps_list)
+            order, probe_first = self._plan_schedule(vps_list)
+        counters = self._new_counters(vps_list)
+        phase_stats = PhaseStats()
         
-        async def test_single_vps(vps_info):
-            async with semaphore:
-                return await self._test_vps_connection(vps_info, use_proxy)
+        source = (vps_list[i] for i in order) if order is not None else vps_list
+        async for position, result in self._run_batch(source, max_concurrent, use_proxy, on_result, counters,
+                                                      journal=journal, resume=resume, probe_first=probe_first,
+                                                      cancel_token=cancel_token, deadline=deadline,
+                                                      progress=progress, keep_connections=keep_connections):
+            index = order[position] if order is not None else position
+            if keep_results:
+                results[index] = result
+            if isinstance(result, dict) and not result.get('resumed'):
+                phase_stats.add(result.get('timings'))
         
-        # 创建所有测试任务
-        for vps_info in vps_list:
-            task = asyncio.create_task(test_single_vps(vps_info))
-            tasks.append(task)
+        return {
+            'total': counters['completed'],
+            'success': counters['success'],
+            'failed': counters['failed'],
+            'results': [results[i] for i in sorted(results)] if keep_results else [],
+            'phase_stats': phase_stats.summary(),
+            'cancelled': bool(cancel_token and cancel_token.cancelled),
+            'not_attempted': self._not_attempted(counters, cancel_token),
+            'timed_out': counters['timed_out']
+        }
+    
+    async def iter_test(self, vps_list: Iterable[Dict[str, Any]], max_concurrent: int = 10,
+                        use_proxy: bool = True, on_result: Optional[ResultCallback] = None,
+                        journal: Union[None, str, BatchJournal] = None, resume: bool = False,
+                        cancel_token: Optional[CancelToken] = None, schedule: bool = False,
+                        deadline: Optional[float] = None, progress: Optional[ProgressBus] = None,
+                        keep_connections: bool = False):
+        """
+        流式批量测试, 按完成顺序逐台产出结果
         
-        # 等待所有任务完成
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        用法:
+            async for result in manager.iter_test(vps_list):
+                print(result['vps_info']['ip'], result['success'])
         
-        # 统计结果
-        success_count = sum(1 for r in results if isinstance(r, dict) and r.get('success'))
-        failed_count = len(results) - success_count
+        Args:
+            vps_list / max_concurrent / use_proxy / journal / resume / cancel_token / schedule / deadline /
+            progress / keep_connections: 同 test_multiple_vps
+            on_result: 回调 on_result(result, counters), 可以是普通函数或协程函数;
+                       counters 为实时计数 {'total', 'completed', 'success', 'failed', 'cancelled',
+                       'not_attempted', 'timed_out'},
+                       total 在 vps_list 无法取长度时为None
+        """
+        probe_first = None
+        if schedule:
+            vps_list = list(vps_list)
+            order, probe_first = self._plan_schedule(vps_list)
+            vps_list = [vps_list[i] for i in order]
+        counters = self._new_counters(vps_list)
+        async for _, result in self._run_batch(vps_list, max_concurrent, use_proxy, on_result, counters,
+                                               journal=journal, resume=resume, probe_first=probe_first,
+                                               cancel_token=cancel_token, deadline=deadline, progress=progress,
+                                               keep_connections=keep_connections):
+            yield result
+    
+    async def recheck_vps(self, vps_list: Iterable[Dict[str, Any]], fresh_within: float = 300.0,
+                          max_concurrent: int = 10, use_proxy: bool = True,
+                          previous_results: Optional[Iterable[Dict[str, Any]]] = None,
+                          on_result: Optional[ResultCallback] = None,
+                          cancel_token: Optional[CancelToken] = None,
+                          deadline: Optional[float] = None,
+                          progress: Optional[ProgressBus] = None,
+                          keep_connections: bool = False) -> Dict[str, Any]:
+        """
+        增量复检: 只检测过期或上次失败的主机, 与缓存结果合并为一份报告
+        
+        上次成功且在 fresh_within 秒内检测过的主机直接使用上次结果;
+        其余主机按 最近失败 -> 从未检测 -> 成功但已过期(越旧越先) 的顺序检测
+        
+        Args:
+            vps_list: VPS信息列表
+            fresh_within: 成功结果的有效期(秒)
+            max_concurrent / use_proxy / on_result / cancel_token / deadline / keep_connections: 同 test_multiple_vps
+            progress: 进度事件总线, 只报告需要重新检测的主机
+            previous_results: 上次的检测结果列表 (含checked_at); 不传时从健康历史库(history)读取
+            
+        Returns:
+            Dict: 同 test_multiple_vps, 另含 fresh / cached 数量;
+                  每条结果带 source='fresh'(本次检测) 或 'cached'(沿用上次结果)
+        """
+        vps_list = list(vps_list)
+        previous = self._previous_results(vps_list, previous_results)
+        now = time.time()
+        
+        results: Dict[int, Any] = {}
+        counters = self._new_counters(vps_list)
+        to_test = []
+        for index, vps_info in enumerate(vps_list):
+            last = previous.get(host_id(vps_info))
+            if last and last['success'] and now - last['checked_at'] <= fresh_within:
+                cached = dict(last, vps_info=vps_info, source='cached')
+                results[index] = cached
+                await self._record_result(cached, counters, on_result)
+                continue
+            
+            if last is None:
+                priority = (1, 0)
+            elif not last['success']:
+                priority = (0, -last['checked_at'])
+            else:
+                priority = (2, last['checked_at'])
+            to_test.append((priority, index))
+        
+        to_test.sort()
+        order = [index for _, index in to_test]
+        print(f"♻️ 增量复检: {len(vps_list)} 台中 {len(results)} 台沿用缓存结果, 检测 {len(order)} 台")
+        
+        phase_stats = PhaseStats()
+        async for position, result in self._run_batch((vps_list[i] for i in order), max_concurrent,
+                                                      use_proxy, on_result, counters, mark={'source': 'fresh'},
+                                                      cancel_token=cancel_token, deadline=deadline,
+                                                      progress=progress, keep_connections=keep_connections):
+            results[order[position]] = result
+            if isinstance(result, dict):
+                phase_stats.add(result.get('timings'))
         
         return {
-            'total': len(vps_list),
-            'success': success_count,
-            'failed': failed_count,
-            'results': results
+            'total': counters['completed'],
+            'success': counters['success'],
+            'failed': counters['failed'],
+            'fresh': len(order),
+            'cached': len(vps_list) - len(order),
+            'results': [results[i] for i in sorted(results)],
+            'phase_stats': phase_stats.summary(),
+            'cancelled': bool(cancel_token and cancel_token.cancelled),
+            'not_attempted': len(vps_list) - len(results) + counters['not_attempted'],
+            'timed_out': counters['timed_out']
         }
     
-    async def _test_vps_connection(self, vps_info: Dict[str, Any], use_proxy: bool = True) -> Dict[str, Any]:
-        """测试单个VPS连接"""
+    async def run_on_fleet(self, command: str, hosts: Iterable[Dict[str, Any]], max_concurrent: int = 10,
+                           use_proxy: bool = True, timeout: float = 30, keep_results: bool = False,
+                           on_result: Optional[ResultCallback] = None,
+                           cancel_token: Optional[CancelToken] = None,
+                           deadline: Optional[float] = None,
+                           progress: Optional[ProgressBus] = None,
+                           keep_connections: bool = False) -> Dict[str, Any]:
+        """
+        在一批主机上执行同一条命令, 输出相同的主机合并为一组
+        
+        与批量检测共用同一并发引擎和连接池; 如在2000台主机上执行 systemctl is-active xrayL,
+        返回的是按 (stdout, stderr, exit_code) 内容哈希分组的摘要, 而不是2000份重复输出
+        
+        Args:
+            command: 要执行的命令
+            hosts: VPS信息列表 (也可以是迭代器/异步迭代器)
+            timeout: 单台主机的命令超时(秒)
+            keep_results: 是否另外保留逐台结果 (按输入顺序)
+            max_concurrent / use_proxy / on_result / cancel_token / deadline / progress / keep_connections:
+                同 test_multiple_vps
+            
+        Returns:
+            Dict: {'command', 'total', 'success'(退出码为0), 'failed', 'groups', 'results',
+                   'cancelled', 'not_attempted', 'timed_out'}
+                  groups 见 fleet_command.OutputGroups.summary
+        """
+        groups = OutputGroups()
+        results = {}
+        counters = self._new_counters(hosts)
+        
+        async def task(vps_info, deadline_at):
+            return await self._execute_on_vps(vps_info, command, timeout, use_proxy, deadline_at, keep_connections)
+        
+        async for index, result in self._run_batch(hosts, max_concurrent, use_proxy, on_result, counters,
+                                                   task=task, cancel_token=cancel_token, deadline=deadline,
+                                                   progress=progress):
+            groups.add(result)
+            if keep_results:
+                results[index] = result
+        
+        summary = groups.summary()
+        print(f"📋 {command!r}: {counters['completed']} 台主机, {len(summary)} 种不同结果")
+        return {
+            'command': command,
+            'total': counters['completed'],
+            'success': counters['success'],
+            'failed': counters['failed'],
+            'groups': summary,
+            'results': [results[i] for i in sorted(results)] if keep_results else [],
+            'cancelled': bool(cancel_token and cancel_token.cancelled),
+            'not_attempted': self._not_attempted(counters, cancel_token),
+            'timed_out': counters['timed_out']
+        }
+    
+    def _plan_schedule(self, vps_list: List[Dict[str, Any]]) -> Tuple[List[int], Set[str]]:
+        """按预期耗时排定检测顺序, 返回 (输入下标的检测顺序, 需要先探测的主机ID)"""
+        if self.scheduler is None:
+            self.scheduler = HostScheduler(history=self.history, timeouts=self.timeouts,
+                                           circuit_breaker=self.circuit_breaker)
+        plan = self.scheduler.plan(vps_list)
+        tiers = plan['tiers']
+        print(f"🗂️ 调度: 已知正常 {tiers['known_good']} 台, 未检测 {tiers['unknown']} 台, "
+              f"最近失败 {tiers['recent_failure']} 台, 疑似离线 {tiers['dead']} 台 (最后检测, 先探测)")
+        return plan['order'], {host_id(vps_list[i]) for i in plan['probe_first']}
+    
+    def _previous_results(self, vps_list: List[Dict[str, Any]],
+                          previous_results: Optional[Iterable[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        """每台主机上一次的检测结果 {host_id: result}"""
+        if previous_results is not None:
+            latest = {}
+            for result in previous_results:
+                if isinstance(result, dict) and result.get('checked_at') is not None:
+                    key = host_id(result.get('vps_info') or {})
+                    if key not in latest or result['checked_at'] >= latest[key]['checked_at']:
+                        latest[key] = result
+            return latest
+        
+        if self.history is None:
+            return {}
+        
+        previous = {}
+        for key, row in self.history.latest_by_host(host_id(vps_info) for vps_info in vps_list).items():
+            previous[key] = {
+                'success': bool(row['success']),
+                'response_time': row['response_time'],
+                'connection_mode': row['connection_mode'],
+                'proxy_port': row['proxy_port'],
+                'error': row['error'],
+                'error_category': row['error_category'],
+                'checked_at': row['checked_at'],
+            }
+        return previous
+    
+    @staticmethod
+    def _new_counters(vps_list) -> Dict[str, Optional[int]]:
+        return {
+            'total': len(vps_list) if hasattr(vps_list, '__len__') else None,
+            'completed': 0,
+            'success': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'not_attempted': 0,
+            'timed_out': 0,
+        }
+    
+    @staticmethod
+    def _not_attempted(counters: Dict[str, Optional[int]], cancel_token: Optional[CancelToken]) -> Optional[int]:
+        """未开始检测的主机数: 因截止时间跳过的 + 取消后未分发的 (清单长度未知且被取消时为None)"""
+        if counters['total'] is None:
+            return None if cancel_token and cancel_token.cancelled else counters['not_attempted']
+        return counters['not_attempted'] + counters['total'] - counters['completed']
+    
+    async def _run_batch(self, vps_list, max_concurrent: int, use_proxy: bool,
+                         on_result: Optional[ResultCallback], counters: Dict[str, Optional[int]],
+                         journal: Union[None, str, BatchJournal] = None, resume: bool = False,
+                         mark: Optional[Dict[str, Any]] = None, probe_first: Optional[Set[str]] = None,
+                         cancel_token: Optional[CancelToken] = None, deadline: Optional[float] = None,
+                         task: Optional[Callable[[Dict[str, Any], Optional[float]], Awaitable[Any]]] = None,
+                         progress: Optional[ProgressBus] = None, keep_connections: bool = False):
+        """
+        批量执行核心: 产出 (序号, 结果), 并实时更新计数、触发回调
+        mark为附加到每条结果的字段, probe_first中的主机 (host_id) 先做廉价的可达性探测,
+        deadline为整批的时间预算(秒);
+        task(vps_info, deadline_at) 替代连接检测 (如批量执行命令), 其结果不写入健康历史;
+        progress 收到每台主机的 started / phase / completed / failed 事件;
+        keep_connections=False 时检测新建的连接不留在连接池中
+        """
+        if isinstance(journal, str):
+            journal = BatchJournal(journal)
+        if journal is not None and resume:
+            print(f"📒 断点日志 {journal.path}: 已有 {len(journal.load())} 台主机的结果")
+        
+        deadline_at = time.monotonic() + deadline if deadline is not None else None
+        
+        async def check(vps_info):
+            if progress is not None:
+                progress.started(vps_info)
+            if task is not None:
+                return await task(vps_info, deadline_at)
+            result = None
+            if probe_first and host_id(vps_info) in probe_first:
+                if progress is not None:
+                    progress.phase(vps_info, 'probe')
+                result = await self._probe_result(vps_info, use_proxy)
+            if result is None:
+                result = await self._test_vps_connection(vps_info, use_proxy, deadline_at, progress,
+                                                         keep_connection=keep_connections)
+            if journal is not None:
+                journal.append(vps_info, result)
+            if self.history is not None and isinstance(result, dict):
+                self.history.record(result)
+            return result
+        
+        async def test_one(vps_info):
+            if journal is not None and resume:
+                cached = journal.fresh_result(vps_info)
+                if cached is not None:
+                    return cached
+            if deadline_at is None:
+                return await check(vps_info)
+            
+            remaining = deadline_at - time.monotonic()
+            if remaining < self._expected_cost(vps_info):
+                return {'vps_info': vps_info, 'success': False, 'not_attempted': True,
+                        'error': f'批量截止时间 ({deadline}s) 前来不及检测, 未尝试', 'checked_at': time.time()}
+            start = time.monotonic()
+            try:
+                return await asyncio.wait_for(check(vps_info), timeout=remaining)
+            except asyncio.TimeoutError:
+                timings = empty_timings()
+                timings['total'] = time.monotonic() - start
+                return {'vps_info': vps_info, 'success': False, 'timed_out': True,
+                        'error': f'到达批量截止时间 ({deadline}s), 检测被中断', 'error_category': ERROR_TIMEOUT,
+                        'response_time': timings['total'], 'checked_at': time.time(), 'timings': timings}
+        
+        if progress is not None:
+            total = counters['total']
+            progress.begin(total - counters['completed'] if total is not None else None)
+        try:
+            async for index, vps_info, result in iter_bounded(vps_list, test_one, max_concurrent, cancel_token):
+                if isinstance(result, BatchCancelledError):
+                    result = {'vps_info': vps_info, 'success': False, 'error': '检测已取消',
+                              'cancelled': True, 'checked_at': time.time()}
+                if mark and isinstance(result, dict):
+                    result.update(mark)
+                if self.metrics is not None and task is None:
+                    if isinstance(result, dict) and result.get('success'):
+                        self.metrics.hosts_checked.inc(status='success')
+                    else:
+                        self.metrics.hosts_checked.inc(status=self._failure_status(result))
+                await self._record_result(result, counters, on_result)
+                if progress is not None:
+                    progress.finished(result, vps_info)
+                yield index, result
+        finally:
+            if progress is not None:
+                await progress.end()
+            if journal is not None:
+                journal.flush()
+            if self.history is not None:
+                self.history.flush()
+    
+    @staticmethod
+    def _failure_status(result) -> str:
+        """失败结果的细分状态: cancelled / not_attempted / timed_out / failed"""
+        if isinstance(result, dict):
+            for status in ('cancelled', 'not_attempted', 'timed_out'):
+                if result.get(status):
+                    return status
+        return 'failed'
+    
+    @staticmethod
+    async def _record_result(result, counters: Dict[str, Optional[int]],
+                             on_result: Optional[ResultCallback] = None):
+        """更新计数并触发回调 (回调出错不中断批量任务)"""
+        counters['completed'] += 1
+        if isinstance(result, dict) and result.get('success'):
+            counters['success'] += 1
+        else:
+            counters['failed'] += 1
+            status = AsyncSSHManager._failure_status(result)
+            if status != 'failed':
+                counters[status] += 1
+        
+        if on_result is not None:
+            try:
+                outcome = on_result(result, dict(counters))
+                if inspect.isawaitable(outcome):
+                    await outcome
+            except Exception as e:
+                print(f"⚠️ 结果回调出错: {e}")
+    
+    async def _probe_result(self, vps_info: Dict[str, Any], use_proxy: bool) -> Optional[Dict[str, Any]]:
+        """
+        廉价可达性探测: 直连时建立TCP连接, 走代理时完成SOCKS5 CONNECT
+        目标确定不可达时返回失败结果, 可达或无法判断 (如代理本身故障) 时返回None, 交给完整检测
+        """
+        start_time = time.time()
+        start = time.monotonic()
+        ip, port = self._host_key(vps_info)
+        timeout = self.scheduler.probe_timeout if self.scheduler is not None else 3.0
+        leased = None
+        try:
+            proxy = None
+            if use_proxy:
+                await self._ensure_balancer()
+                if self.balancer is not None:
+                    proxy = leased = await self.balancer.acquire()
+                else:
+                    client = self._new_client()
+                    proxy_port = await client._resolve_proxy_port()
+                    proxy = (client.proxy_host, proxy_port) if proxy_port else None
+            
+            if proxy:
+                transport, _ = await asyncio.wait_for(socks5_handshake(proxy[0], proxy[1], ip, port), timeout=timeout)
+                transport.close()
+            else:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout=timeout)
+                writer.close()
+            return None
+        except Exception as e:
+            category = classify_error(e)
+            if category not in (ERROR_CONNECTION, ERROR_TIMEOUT):
+                return None
+            timings = empty_timings()
+            timings['total'] = time.monotonic() - start
+            return {
+                'vps_info': vps_info,
+                'success': False,
+                'error': f"预探测不可达: {str(e) or '连接超时'}",
+                'error_category': category,
+                'attempts': 0,
+                'probed': True,
+                'response_time': time.time() - start_time,
+                'checked_at': time.time(),
+                'timings': timings
+            }
+        finally:
+            if leased is not None:
+                await self.balancer.release(leased)
+    
+    async def _test_vps_connection(self, vps_info: Dict[str, Any], use_proxy: bool = True,
+                                   deadline_at: Optional[float] = None,
+                                   progress: Optional[ProgressBus] = None,
+                                   keep_connection: bool = True) -> Dict[str, Any]:
+        """测试单个VPS连接 (timings 为分阶段耗时, 见 ssh_timing; deadline_at 为批量截止时间点)"""
         start_time = time.time()
+        start = time.monotonic()
         
         try:
-            async with AsyncSSHClient(
-                proxy_host=self.proxy_host,
-                proxy_port=self.proxy_port,
-                auto_detect_proxy=self.auto_detect_proxy
-            ) as client:
-                
-                # 建立连接
-                connected = await client.connect(
-                    hostname=vps_info.get('ip'),
-                    port=vps_info.get('port', 22),
-                    username=vps_info.get('username', 'root'),
-                    password=vps_info.get('password'),
-                    timeout=30,
-                    use_proxy=use_proxy
-                )
-                
-                if not connected:
-                    return {
-                        'vps_info': vps_info,
-                        'success': False,
-                        'error': 'SSH连接失败',
-                        'response_time': time.time() - start_time
-                    }
+            # 建立连接 (连接池中有可用会话时直接复用)
+            async with self._client_for(vps_info, use_proxy, deadline_at=deadline_at,
+                                        keep=keep_connection) as client:
+                if progress is not None:
+                    progress.phase(vps_info, 'command')
+                timings = empty_timings() if client.reused else dict(client.timings)
                 
                 # 测试连接状态
-                test_result = await client.test_connection()
+                command_start = time.monotonic()
+                test_result = await client.test_connection(
+                    timeout=self._within_deadline(self._command_timeout(vps_info), deadline_at)
+                )
+                timings['first_command'] = time.monotonic() - command_start
+                command_timed_out = not test_result['connected'] and \
+                    is_timeout_error(Exception(test_result.get('error', '')))
+                if self.timeouts is not None:
+                    if test_result['connected']:
+                        self.timeouts.record_command(self._host_key(vps_info), test_result['response_time'])
+                    elif command_timed_out:
+                        self.timeouts.record_command_timeout(self._host_key(vps_info))
+                if self.metrics is not None:
+                    self.metrics.command_duration.observe(timings['first_command'], kind='probe')
+                    if command_timed_out:
+                        self.metrics.timeouts.inc(kind='command')
                 
-                return {
+                result = {
                     'vps_info': vps_info,
                     'success': test_result['connected'],
                     'response_time': test_result.get('response_time', time.time() - start_time),
                     'test_output': test_result.get('test_output'),
                     'connection_mode': test_result.get('connection_mode'),
                     'proxy_port': test_result.get('proxy_port'),
-                    'error': test_result.get('error')
+                    'connected_via': test_result.get('connected_via'),
+                    'error': test_result.get('error'),
+                    'reused_connection': client.reused,
+                    'attempts': 0 if client.reused else client.connect_attempts,
+                    'checked_at': time.time(),
+                    'timings': timings
                 }
+                close_start = time.monotonic()
+            
+            timings['close'] = time.monotonic() - close_start
+            timings['total'] = time.monotonic() - start
+            return result
                 
         except Exception as e:
+            timings = dict(getattr(e, 'timings', None) or empty_timings())
+            timings['total'] = time.monotonic() - start
             return {
                 'vps_info': vps_info,
                 'success': False,
                 'error': str(e),
-                'response_time': time.time() - start_time
+                'error_category': getattr(e, 'category', classify_error(e)),
+                'attempts': getattr(e, 'attempts', 1),
+                'response_time': time.time() - start_time,
+                'checked_at': time.time(),
+                'timings': timings
             }
 
 
@@ -419,25 +1651,34 @@ async def example_usage():
         # 可以添加更多VPS
     ]
     
-    manager = AsyncSSHManager(auto_detect_proxy=True)
-    batch_results = await manager.test_multiple_vps(vps_list, max_concurrent=5, use_proxy=True)
-    
-    print(f"📈 批量测试结果:")
-    print(f"   总数: {batch_results['total']}")
-    print(f"   成功: {batch_results['success']}")
-    print(f"   失败: {batch_results['failed']}")
-    
-    # 显示详细结果
-    for i, result in enumerate(batch_results['results']):
-        if isinstance(result, dict):
-            vps_name = result['vps_info'].get('name', f'VPS-{i+1}')
-            status = '✅ 成功' if result['success'] else '❌ 失败'
-            mode = result.get('connection_mode', '未知')
-            time_cost = result.get('response_time', 0)
-            
-            print(f"   {vps_name}: {status} ({mode}) - {time_cost:.2f}s")
-            if not result['success']:
-                print(f"      错误: {result.get('error', '未知错误')}")
+    async with AsyncSSHManager(auto_detect_proxy=True) as manager:
+        # keep_connections=True: 检测建立的会话留在连接池中, 下面执行命令时直接复用
+        batch_results = await manager.test_multiple_vps(vps_list, max_concurrent=5, use_proxy=True,
+                                                        keep_connections=True)
+        
+        print(f"📈 批量测试结果:")
+        print(f"   总数: {batch_results['total']}")
+        print(f"   成功: {batch_results['success']}")
+        print(f"   失败: {batch_results['failed']}")
+        
+        # 显示详细结果
+        for i, result in enumerate(batch_results['results']):
+            if isinstance(result, dict):
+                vps_name = result['vps_info'].get('name', f'VPS-{i+1}')
+                status = '✅ 成功' if result['success'] else '❌ 失败'
+                mode = result.get('connection_mode', '未知')
+                time_cost = result.get('response_time', 0)
+                
+                print(f"   {vps_name}: {status} ({mode}) - {time_cost:.2f}s")
+                if not result['success']:
+                    print(f"      错误: {result.get('error', '未知错误')}")
+        
+        # 检测通过的VPS直接复用连接池中的会话执行命令
+        for vps_info in vps_list:
+            cmd_result = await manager.execute_on_vps(vps_info, 'uname -a')
+            if cmd_result['success']:
+                reused = '复用连接' if cmd_result['reused_connection'] else '新建连接'
+                print(f"   💻 {vps_info.get('name')}: {cmd_result['stdout'].strip()} ({reused})")
     
     # 3. 测试直连模式（不使用代理）
     print(f"\n🔄 测试直连模式...")
@@ -457,5 +1698,5 @@ async def example_usage():
 
 
 if __name__ == '__main__':
-    # 运行示例
-    asyncio.run(example_usage()) 
\ No newline at end of file
+    # 运行示例 (--uvloop 使用uvloop事件循环)
+    run_async(example_usage(), use_uvloop='--uvloop' in sys.argv) 
\ No newline at end of file
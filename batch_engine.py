@@ -0,0 +1,176 @@
+"""
+批量任务执行引擎
+固定数量的worker从VPS列表(迭代器或异步迭代器)中逐个取任务执行,
+同时存在的任务数与并发数一致, 内存占用与并发数成正比而与列表长度无关
+
+用法:
+    async for index, vps_info, result in iter_bounded(vps_list, worker, max_concurrent=100):
+        ...
+
+CancelToken 用于中途停止批量任务 (可在GUI线程等其他线程中调用 cancel())
+"""
+
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, AsyncIterable, Optional, Tuple, Union
+
+
+_WORKER_DONE = object()
+
+
+class BatchCancelledError(Exception):
+    """任务在执行中被取消 (作为该任务的结果产出)"""
+
+
+class CancelToken:
+    """
+    批量任务取消令牌
+    
+    cancel() 后不再分发新任务; 执行中的任务有 grace_period 秒的时间自然完成,
+    之后被强制取消 (中断SOCKS握手/SSH握手, 连接随之关闭)
+    """
+
+    def __init__(self, grace_period: float = 0.5):
+        self.grace_period = grace_period
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._waiters = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self):
+        """请求取消 (线程安全)"""
+        with self._lock:
+            self._cancelled = True
+            waiters, self._waiters = self._waiters, []
+        for loop, event in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(event.set)
+
+    async def wait(self):
+        """等待取消请求"""
+        event = asyncio.Event()
+        with self._lock:
+            if self._cancelled:
+                return
+            self._waiters.append((asyncio.get_running_loop(), event))
+        await event.wait()
+
+
+async def _as_async_iter(items: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def iter_bounded(items: Union[Iterable, AsyncIterable],
+                       worker: Callable[[Any], Awaitable[Any]],
+                       max_concurrent: int = 10,
+                       cancel_token: Optional[CancelToken] = None) -> AsyncIterator[Tuple[int, Any, Any]]:
+    """
+    以有限并发执行 worker(item), 按完成顺序产出结果
+
+    Args:
+        items: 任务来源, 普通迭代器或异步迭代器 (按需读取, 不会一次性展开)
+        worker: 处理单个任务的协程函数
+        max_concurrent: worker数量 (同时执行的任务数)
+        cancel_token: 取消令牌; 取消后停止分发, 宽限期后仍未完成的任务结果为 BatchCancelledError
+
+    Yields:
+        (index, item, result): index为任务在来源中的序号; worker抛出异常时result为该异常对象
+    """
+    if max_concurrent < 1:
+        raise ValueError("max_concurrent 必须大于0")
+
+    source = _as_async_iter(items)
+    source_lock = asyncio.Lock()
+    # 队列长度有上限: 消费方处理慢时worker暂停取新任务
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_concurrent)
+    state = {'next_index': 0, 'exhausted': False, 'error': None}
+
+    def cancelling() -> bool:
+        return cancel_token is not None and cancel_token.cancelled
+
+    async def next_item():
+        async with source_lock:
+            if state['exhausted'] or cancelling():
+                return None
+            try:
+                item = await source.__anext__()
+            except StopAsyncIteration:
+                state['exhausted'] = True
+                return None
+            except Exception as e:
+                # 任务来源本身出错: 停止分发并在消费方抛出
+                state['exhausted'] = True
+                state['error'] = e
+                return None
+            index = state['next_index']
+            state['next_index'] += 1
+            return index, item
+
+    async def run_worker():
+        try:
+            while True:
+                entry = await next_item()
+                if entry is None:
+                    break
+                index, item = entry
+                cancelled = False
+                try:
+                    result = await worker(item)
+                except asyncio.CancelledError:
+                    if not cancelling():
+                        raise
+                    result, cancelled = BatchCancelledError('任务已取消'), True
+                except Exception as e:
+                    result = e
+                # 投递结果期间不会被取消令牌中断, 避免丢失已完成的结果
+                delivering.add(asyncio.current_task())
+                await queue.put((index, item, result))
+                delivering.discard(asyncio.current_task())
+                if cancelled:
+                    break
+        except asyncio.CancelledError:
+            # 取消令牌强制中断时仍需通知消费方本worker已结束
+            if not cancelling():
+                raise
+        # 结束标记同样不能被取消令牌中断 (消费方处理慢时队列已满, 此处会等待),
+        # 否则消费方永远等不到所有worker结束
+        delivering.add(asyncio.current_task())
+        await queue.put(_WORKER_DONE)
+
+    async def enforce_cancel():
+        await cancel_token.wait()
+        await asyncio.wait(workers, timeout=cancel_token.grace_period)
+        for task in workers:
+            if not task.done() and task not in delivering:
+                task.cancel()
+
+    delivering = set()
+    workers = [asyncio.create_task(run_worker()) for _ in range(max_concurrent)]
+    watcher = asyncio.create_task(enforce_cancel()) if cancel_token is not None else None
+    running = len(workers)
+    try:
+        while running:
+            entry = await queue.get()
+            if entry is _WORKER_DONE:
+                running -= 1
+                continue
+            yield entry
+
+        if state['error'] is not None:
+            raise state['error']
+    finally:
+        # 消费方提前退出或被取消时, 停止所有worker
+        if watcher is not None:
+            watcher.cancel()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, *([watcher] if watcher else []), return_exceptions=True)
+        await source.aclose()
@@ -0,0 +1,121 @@
+"""
+批量检测断点续跑日志
+每台主机完成后把结果追加写入JSONL文件, 进程崩溃或GUI关闭后用 resume=True 重新运行,
+已有新鲜结果的主机直接复用, 只检测剩余部分
+
+特点:
+1. 按稳定主机ID (用户名@IP:端口, 或vps_info中的id) 记录, 与清单顺序无关
+2. 批量写入: 攒够 flush_size 条或距上次写入超过 flush_interval 秒才落盘
+3. 不记录密码/私钥等敏感字段, 恢复时重新附加当前清单中的vps_info
+4. 崩溃时最后一行可能不完整, 加载时自动跳过
+"""
+
+import json
+import os
+import time
+from typing import Optional, Dict, Any, List
+
+SENSITIVE_KEYS = ('password', 'private_key', 'passphrase')
+
+
+def host_id(vps_info: Dict[str, Any]) -> str:
+    """主机的稳定ID"""
+    if vps_info.get('id') is not None:
+        return str(vps_info['id'])
+    return f"{vps_info.get('username', 'root')}@{vps_info.get('ip')}:{vps_info.get('port', 22)}"
+
+
+class BatchJournal:
+    """JSONL格式的批量结果日志"""
+
+    def __init__(self, path: str, max_age: Optional[float] = None,
+                 flush_size: int = 100, flush_interval: float = 1.0):
+        """
+        Args:
+            path: 日志文件路径 (不存在时自动创建)
+            max_age: 结果的有效期(秒), 超过后续跑时重新检测; None表示始终有效
+            flush_size: 缓冲多少条结果后写入磁盘
+            flush_interval: 距上次写入超过该时间(秒)后写入磁盘
+        """
+        self.path = path
+        self.max_age = max_age
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._tail_checked = False
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """读取日志, 返回 {host_id: 记录}, 同一主机以最后一条为准"""
+        entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        entries[record['host_id']] = record
+                    except (ValueError, KeyError, TypeError):
+                        # 崩溃时写了一半的行
+                        continue
+        self._entries = entries
+        return entries
+
+    def fresh_result(self, vps_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """主机的有效结果 (已附加当前vps_info并标记 resumed=True), 没有则返回None"""
+        if self._entries is None:
+            self.load()
+        record = self._entries.get(host_id(vps_info))
+        if record is None:
+            return None
+        if self.max_age is not None and time.time() - record['finished_at'] > self.max_age:
+            return None
+
+        result = dict(record['result'])
+        result['vps_info'] = vps_info
+        result['resumed'] = True
+        return result
+
+    def append(self, vps_info: Dict[str, Any], result: Any):
+        """记录一台主机的结果 (缓冲写入)"""
+        if isinstance(result, dict):
+            stored = {key: value for key, value in result.items() if key != 'vps_info'}
+        else:
+            stored = {'success': False, 'error': str(result)}
+        stored['vps_info'] = {key: value for key, value in vps_info.items() if key not in SENSITIVE_KEYS}
+
+        record = {'host_id': host_id(vps_info), 'finished_at': time.time(), 'result': stored}
+        self._buffer.append(json.dumps(record, ensure_ascii=False, default=str))
+        if self._entries is not None:
+            self._entries[record['host_id']] = record
+
+        if len(self._buffer) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """把缓冲的结果写入磁盘"""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        data = ('\n'.join(self._buffer) + '\n').encode('utf-8')
+        with open(self.path, 'ab+') as f:
+            if not self._tail_checked:
+                # 上次崩溃留下的不完整行不能与新记录拼接在一起
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        data = b'\n' + data
+                self._tail_checked = True
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._buffer.clear()
+
+    def reset(self):
+        """清空日志 (开始全新的批量任务)"""
+        self._buffer.clear()
+        self._entries = {}
+        self._tail_checked = False
+        if os.path.exists(self.path):
+            os.remove(self.path)
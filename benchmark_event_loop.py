@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件循环性能基准测试
+对比 默认asyncio事件循环 与 uvloop 的每秒SSH连接数和p99握手延迟
+
+在独立子进程中启动本地SSH服务端(密码认证), 客户端依次在两种事件循环上
+完成同样数量的 TCP连接 + 密钥交换 + 认证, 不依赖任何外部网络
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+import asyncssh
+
+from asyncssh_client import run_async, uvloop
+
+
+USERNAME = 'bench'
+PASSWORD = 'bench'
+
+
+class _BenchmarkServer(asyncssh.SSHServer):
+    def begin_auth(self, username):
+        return True
+
+    def password_auth_supported(self):
+        return True
+
+    def validate_password(self, username, password):
+        return username == USERNAME and password == PASSWORD
+
+
+def _serve(port_queue, host: str):
+    """SSH服务端子进程 (始终使用默认事件循环, 保证两轮测试的服务端一致)"""
+    async def main():
+        server = await asyncssh.create_server(
+            _BenchmarkServer, host, 0,
+            server_host_keys=[asyncssh.generate_private_key('ssh-ed25519')],
+            backlog=4096
+        )
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+async def ssh_connect(host: str, port: int):
+    connection = await asyncssh.connect(host, port, username=USERNAME, password=PASSWORD,
+                                        known_hosts=None, client_keys=None)
+    connection.close()
+    await connection.wait_closed()
+
+
+async def run_benchmark(host: str, port: int, total: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await ssh_connect(host, port)
+                latencies.append(time.perf_counter() - start)
+            except (OSError, asyncssh.Error):
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)] if latencies else 0
+    return {
+        'connects_per_sec': len(latencies) / elapsed if elapsed else 0,
+        'p99_ms': p99 * 1000,
+        'failures': failures,
+        'elapsed': elapsed,
+        'loop': type(asyncio.get_running_loop()).__module__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='事件循环性能基准测试 (asyncio vs uvloop)')
+    parser.add_argument('--total', type=int, default=500, help='总连接次数')
+    parser.add_argument('--concurrency', type=int, default=50, help='并发连接数')
+    parser.add_argument('--host', default='127.0.0.1', help='本地SSH服务端监听地址')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    port_queue = context.Queue()
+    server = context.Process(target=_serve, args=(port_queue, args.host), daemon=True)
+    server.start()
+    port = port_queue.get(timeout=30)
+
+    print(f"🚀 SSH事件循环基准测试: {args.total} 次连接, 并发 {args.concurrency}, 服务端 {args.host}:{port}")
+    print("=" * 60)
+
+    candidates = [('asyncio', False)]
+    if uvloop is not None:
+        candidates.append(('uvloop', True))
+    else:
+        print("⚠️ 未安装uvloop, 仅测试默认事件循环 (pip install uvloop)")
+
+    try:
+        # 预热: 生成密钥、建立服务端状态, 避免首轮测试吃亏
+        run_async(run_benchmark(args.host, port, min(args.concurrency, args.total), args.concurrency))
+
+        for name, use_uvloop in candidates:
+            result = run_async(run_benchmark(args.host, port, args.total, args.concurrency),
+                               use_uvloop=use_uvloop)
+            print(f"   {name:<8} {result['connects_per_sec']:>8.1f} 连接/秒 | "
+                  f"p99握手 {result['p99_ms']:>7.1f}ms | 失败 {result['failures']} | "
+                  f"用时 {result['elapsed']:.2f}s ({result['loop']})")
+    finally:
+        server.terminate()
+        server.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
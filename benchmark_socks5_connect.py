@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SOCKS5连接性能基准测试
+对比 原生asyncio SOCKS5客户端 与 PySocks+线程池 的每秒连接数
+
+在本地启动一个SOCKS5代理替身和一个发送SSH banner的目标服务,
+不依赖任何外部网络
+"""
+
+import argparse
+import asyncio
+import math
+import socket
+import struct
+import time
+
+from socks5_async import open_socks5_connection
+
+try:
+    import socks
+except ImportError:
+    socks = None
+
+
+BANNER = b'SSH-2.0-BenchmarkTarget\r\n'
+
+
+class LocalSocks5Server:
+    """本地SOCKS5代理替身 (支持无认证和用户名/密码认证, 仅实现CONNECT)"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 username: str = None, password: str = None, connect_delay: float = 0.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.connect_delay = connect_delay
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    async def _handle(self, reader, writer):
+        upstream_writer = None
+        try:
+            version, nmethods = await reader.readexactly(2)
+            methods = await reader.readexactly(nmethods)
+            if self.username is not None:
+                if 0x02 not in methods:
+                    writer.write(b'\x05\xff')
+                    return
+                writer.write(b'\x05\x02')
+                _, ulen = await reader.readexactly(2)
+                user = await reader.readexactly(ulen)
+                plen = (await reader.readexactly(1))[0]
+                pwd = await reader.readexactly(plen)
+                ok = user.decode() == self.username and pwd.decode() == self.password
+                writer.write(b'\x01\x00' if ok else b'\x01\x01')
+                if not ok:
+                    return
+            else:
+                writer.write(b'\x05\x00')
+
+            _, cmd, _, atyp = await reader.readexactly(4)
+            if atyp == 0x01:
+                host = socket.inet_ntoa(await reader.readexactly(4))
+            elif atyp == 0x04:
+                host = socket.inet_ntop(socket.AF_INET6, await reader.readexactly(16))
+            else:
+                length = (await reader.readexactly(1))[0]
+                host = (await reader.readexactly(length)).decode('idna')
+            port = struct.unpack('!H', await reader.readexactly(2))[0]
+
+            if self.connect_delay:
+                await asyncio.sleep(self.connect_delay)
+
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection(host, port)
+            except OSError:
+                writer.write(b'\x05\x05\x00\x01' + bytes(6))
+                return
+            writer.write(b'\x05\x00\x00\x01' + socket.inet_aton('0.0.0.0') + b'\x00\x00')
+
+            await asyncio.gather(self._pipe(reader, upstream_writer),
+                                 self._pipe(upstream_reader, writer))
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # 停止替身服务时会取消仍在转发的连接
+            pass
+        finally:
+            if upstream_writer:
+                upstream_writer.close()
+            writer.close()
+
+    @staticmethod
+    async def _pipe(reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def start_banner_server(host: str = '127.0.0.1'):
+    """启动一个模拟SSH服务端banner的目标服务"""
+    async def handle(reader, writer):
+        writer.write(BANNER)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, host, 0, backlog=4096)
+    return server, server.sockets[0].getsockname()[1]
+
+
+class _BannerProtocol(asyncio.Protocol):
+    def __init__(self, waiter):
+        self.waiter = waiter
+        self.buffer = b''
+
+    def data_received(self, data):
+        self.buffer += data
+        if b'\r\n' in self.buffer and not self.waiter.done():
+            self.waiter.set_result(self.buffer)
+
+    def connection_lost(self, exc):
+        if not self.waiter.done():
+            self.waiter.set_exception(ConnectionError('连接在收到banner前关闭'))
+
+
+async def native_connect(proxy_port: int, target_port: int):
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+    transport, _ = await open_socks5_connection('127.0.0.1', proxy_port, '127.0.0.1', target_port,
+                                                lambda: _BannerProtocol(waiter), timeout=30)
+    try:
+        await waiter
+    finally:
+        transport.close()
+
+
+async def pysocks_connect(proxy_port: int, target_port: int):
+    def create_socks_connection():
+        sock = socks.socksocket()
+        sock.set_proxy(socks.SOCKS5, '127.0.0.1', proxy_port)
+        sock.settimeout(30)
+        sock.connect(('127.0.0.1', target_port))
+        return sock
+
+    loop = asyncio.get_running_loop()
+    sock = await loop.run_in_executor(None, create_socks_connection)
+    sock.setblocking(False)
+    reader, writer = await asyncio.open_connection(sock=sock)
+    try:
+        await reader.readline()
+    finally:
+        writer.close()
+
+
+async def run_benchmark(connect_func, proxy_port: int, target_port: int,
+                        total: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await connect_func(proxy_port, target_port)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[max(0, math.ceil(len(latencies) * 0.99) - 1)] if latencies else 0
+    return {
+        'connects_per_sec': len(latencies) / elapsed if elapsed else 0,
+        'p99_ms': p99 * 1000,
+        'failures': failures,
+        'elapsed': elapsed,
+    }
+
+
+async def main_async(total: int, concurrency: int, connect_delay: float):
+    server, target_port = await start_banner_server()
+    async with LocalSocks5Server(connect_delay=connect_delay) as proxy:
+        print(f"🚀 SOCKS5连接基准测试: {total} 次连接, 并发 {concurrency}, 代理延迟 {connect_delay * 1000:.0f}ms")
+        print("=" * 60)
+
+        candidates = [('原生asyncio', native_connect)]
+        if socks is not None:
+            candidates.append(('PySocks+线程池', pysocks_connect))
+        else:
+            print("⚠️ 未安装PySocks, 跳过线程池对比")
+
+        for name, func in candidates:
+            result = await run_benchmark(func, proxy.port, target_port, total, concurrency)
+            print(f"   {name:<14} {result['connects_per_sec']:>9.1f} 连接/秒 | "
+                  f"p99 {result['p99_ms']:>7.1f}ms | 失败 {result['failures']} | 用时 {result['elapsed']:.2f}s")
+
+    server.close()
+    await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SOCKS5连接性能基准测试')
+    parser.add_argument('--total', type=int, default=2000, help='总连接次数')
+    parser.add_argument('--concurrency', type=int, default=200, help='并发连接数')
+    parser.add_argument('--connect-delay', type=float, default=0.05,
+                        help='代理替身模拟的上游连接延迟(秒)')
+    args = parser.parse_args()
+    asyncio.run(main_async(args.total, args.concurrency, args.connect_delay))
+
+
+if __name__ == "__main__":
+    main()
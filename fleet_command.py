@@ -0,0 +1,68 @@
+"""
+批量命令输出分组
+在上千台主机上执行同一命令 (如 systemctl is-active xrayL, uname -a) 时, 大部分主机的输出完全相同。
+按 (stdout, stderr, exit_code) 的内容哈希分组, 每组只保存一份输出和主机ID列表,
+结果大小取决于不同输出的种类数, 而不是主机数
+
+执行失败 (连接失败/超时/取消等) 的主机按失败类别分组, 保留第一条错误信息作为示例
+"""
+
+import hashlib
+from typing import Optional, Dict, Any, List
+
+from batch_journal import host_id
+
+
+def output_digest(stdout: Optional[str], stderr: Optional[str], exit_code: Optional[int]) -> str:
+    """命令输出的内容哈希"""
+    digest = hashlib.sha256()
+    for part in (stdout or '', stderr or '', '' if exit_code is None else str(exit_code)):
+        data = part.encode('utf-8', 'surrogateescape')
+        # 带长度前缀, 避免 ('a\0', 'b') 与 ('a', '\0b') 这类拼接冲突
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    return digest.hexdigest()[:16]
+
+
+def _failure_key(result: Dict[str, Any]) -> str:
+    for status in ('cancelled', 'not_attempted', 'timed_out'):
+        if result.get(status):
+            return status
+    return result.get('error_category') or 'error'
+
+
+class OutputGroups:
+    """按输出内容分组的批量命令结果"""
+
+    def __init__(self):
+        self._groups: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, result: Any):
+        """加入一台主机的执行结果 (execute_on_vps 的返回值)"""
+        if not isinstance(result, dict):
+            result = {'vps_info': {}, 'error': str(result)}
+
+        if result.get('exit_code') is not None:
+            stdout, stderr, exit_code = result.get('stdout'), result.get('stderr'), result['exit_code']
+            key = output_digest(stdout, stderr, exit_code)
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = {'digest': key, 'count': 0, 'stdout': stdout, 'stderr': stderr,
+                                             'exit_code': exit_code, 'error': None, 'hosts': []}
+        else:
+            key = f"error:{_failure_key(result)}"
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = {'digest': key, 'count': 0, 'stdout': None, 'stderr': None,
+                                             'exit_code': None, 'error': result.get('error'), 'hosts': []}
+
+        group['count'] += 1
+        group['hosts'].append(host_id(result.get('vps_info') or {}))
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Returns:
+            [{'digest', 'count', 'stdout', 'stderr', 'exit_code', 'error', 'hosts'}], 主机数多的组在前;
+            执行失败的组 exit_code 为None, error 为该组第一条错误信息
+        """
+        return sorted(self._groups.values(), key=lambda g: (-g['count'], g['digest']))
@@ -0,0 +1,301 @@
+"""
+VPS健康检测历史 (SQLite)
+保存每次 _test_vps_connection 的结果, 用于按趋势调度和生成报表, 而不是只看最近一次快照
+
+特点:
+1. 主机+时间、时间、状态、代理端口均有索引
+2. 批量检测结果缓冲后一次事务批量写入 (executemany)
+3. 查询: 最近N次结果、按主机/代理的p50/p95延迟、状态翻转(成功<->失败)的主机
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any, List, Iterable, Sequence
+
+from batch_journal import host_id
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    host_id TEXT NOT NULL,
+    ip TEXT,
+    port INTEGER,
+    checked_at REAL NOT NULL,
+    success INTEGER NOT NULL,
+    response_time REAL,
+    connection_mode TEXT,
+    proxy_port INTEGER,
+    error TEXT,
+    error_category TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_checks_host_time ON checks (host_id, checked_at);
+CREATE INDEX IF NOT EXISTS idx_checks_time ON checks (checked_at);
+CREATE INDEX IF NOT EXISTS idx_checks_status ON checks (success, checked_at);
+CREATE INDEX IF NOT EXISTS idx_checks_proxy ON checks (proxy_port, checked_at);
+"""
+
+_COLUMNS = ('host_id', 'ip', 'port', 'checked_at', 'success', 'response_time',
+            'connection_mode', 'proxy_port', 'error', 'error_category')
+
+
+# 单条语句 IN (...) 的参数个数 (低于SQLite旧版本默认的999个变量上限)
+_IN_CHUNK = 500
+
+
+def _chunks(hosts: Iterable[str]) -> Iterable[List[str]]:
+    """去重后按 _IN_CHUNK 分段"""
+    unique = list(dict.fromkeys(hosts))
+    for start in range(0, len(unique), _IN_CHUNK):
+        yield unique[start:start + _IN_CHUNK]
+
+
+def _rank_index(percentile: float, count: int) -> int:
+    """最近秩法分位数在有序样本中的下标"""
+    return max(0, min(count - 1, math.ceil(percentile / 100 * count) - 1))
+
+
+class HostHistory:
+    """主机健康历史库"""
+
+    def __init__(self, path: str = 'vps_history.db', flush_size: int = 200, flush_interval: float = 2.0):
+        """
+        Args:
+            path: SQLite数据库文件路径 (':memory:' 为内存库)
+            flush_size: 缓冲多少条记录后批量写入
+            flush_interval: 距上次写入超过该时间(秒)后写入
+        """
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending: List[tuple] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        # GUI线程和批量任务线程可能共用同一实例, 由 _lock 串行化访问
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    # ---- 写入 ----
+
+    def record(self, result: Dict[str, Any], checked_at: Optional[float] = None):
+        """记录一次检测结果 (缓冲写入)"""
+        vps_info = result.get('vps_info') or {}
+        row = (
+            host_id(vps_info),
+            vps_info.get('ip'),
+            vps_info.get('port', 22),
+            checked_at or result.get('checked_at') or time.time(),
+            1 if result.get('success') else 0,
+            result.get('response_time'),
+            result.get('connection_mode'),
+            result.get('proxy_port'),
+            result.get('error'),
+            result.get('error_category'),
+        )
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.flush_size or \
+                    time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def record_many(self, results: Iterable[Dict[str, Any]]):
+        """批量记录 (如一次 test_multiple_vps 的全部结果)"""
+        now = time.time()
+        for result in results:
+            if isinstance(result, dict):
+                self.record(result, result.get('checked_at') or now)
+        self.flush()
+
+    def flush(self):
+        """把缓冲的记录在一个事务中写入"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+            rows, self._pending = self._pending, []
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT INTO checks ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    rows
+                )
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    # ---- 查询 ----
+
+    def _query(self, sql: str, params: Sequence = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            self.flush()
+            return self._conn.execute(sql, params).fetchall()
+
+    def last_results(self, host: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """主机最近N次检测结果 (新的在前), host为 host_id()"""
+        rows = self._query(
+            "SELECT * FROM checks WHERE host_id = ? ORDER BY checked_at DESC LIMIT ?", (host, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def latest_by_host(self, hosts: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """每台主机最近一次检测结果 (指定hosts时只查询这些主机, 走 host_id+时间 索引)"""
+        sql = ("SELECT c.* FROM checks c JOIN (SELECT host_id, MAX(checked_at) AS latest FROM checks "
+               "{where} GROUP BY host_id) m ON c.host_id = m.host_id AND c.checked_at = m.latest")
+        if hosts is None:
+            return {row['host_id']: dict(row) for row in self._query(sql.format(where=''))}
+
+        latest = {}
+        for chunk in _chunks(hosts):
+            where = f"WHERE host_id IN ({', '.join('?' * len(chunk))})"
+            for row in self._query(sql.format(where=where), chunk):
+                latest[row['host_id']] = dict(row)
+        return latest
+
+    def host_summaries(self, hosts: Optional[Iterable[str]] = None,
+                       window: int = 5) -> Dict[str, Dict[str, Any]]:
+        """
+        每台主机最近 window 次检测的摘要 (调度器使用)
+
+        Returns:
+            {host_id: {'last_success', 'consecutive_failures', 'latency'(最近成功检测的平均响应时间),
+                       'last_checked', 'proxy_port'}}
+        """
+        sql = """
+            SELECT host_id, success, response_time, checked_at, proxy_port FROM (
+                SELECT host_id, success, response_time, checked_at, proxy_port,
+                       ROW_NUMBER() OVER (PARTITION BY host_id ORDER BY checked_at DESC) AS rn
+                FROM checks {where}
+            )
+            WHERE rn <= ?
+            ORDER BY host_id, checked_at DESC
+        """
+        if hosts is None:
+            rows = self._query(sql.format(where=''), (window,))
+        else:
+            rows = []
+            for chunk in _chunks(hosts):
+                where = f"WHERE host_id IN ({', '.join('?' * len(chunk))})"
+                rows.extend(self._query(sql.format(where=where), chunk + [window]))
+
+        summaries: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            key = row['host_id']
+            summary = summaries.get(key)
+            if summary is None:
+                summary = summaries[key] = {
+                    'last_success': bool(row['success']),
+                    'consecutive_failures': 0,
+                    'latency': None,
+                    'last_checked': row['checked_at'],
+                    'proxy_port': row['proxy_port'],
+                    '_streak': True,
+                    '_latencies': [],
+                }
+            if summary['_streak'] and not row['success']:
+                summary['consecutive_failures'] += 1
+            else:
+                summary['_streak'] = False
+            if row['success'] and row['response_time'] is not None:
+                summary['_latencies'].append(row['response_time'])
+
+        for summary in summaries.values():
+            latencies = summary.pop('_latencies')
+            summary.pop('_streak')
+            summary['latency'] = sum(latencies) / len(latencies) if latencies else None
+        return summaries
+
+    def latency_percentiles(self, host: Optional[str] = None, proxy_port: Optional[int] = None,
+                            since: Optional[float] = None,
+                            percentiles: Sequence[int] = (50, 95)) -> Dict[str, Optional[float]]:
+        """
+        成功检测的响应时间分位数
+
+        Args:
+            host: 只统计该主机 (host_id)
+            proxy_port: 只统计经该代理端口的检测
+            since: 只统计该时间戳之后的检测
+
+        Returns:
+            {'count': 样本数, 'p50': ..., 'p95': ...}
+        """
+        conditions = ["success = 1", "response_time IS NOT NULL"]
+        params: List[Any] = []
+        if host is not None:
+            conditions.append("host_id = ?")
+            params.append(host)
+        if proxy_port is not None:
+            conditions.append("proxy_port = ?")
+            params.append(proxy_port)
+        if since is not None:
+            conditions.append("checked_at >= ?")
+            params.append(since)
+        where = " AND ".join(conditions)
+
+        count = self._query(f"SELECT COUNT(*) FROM checks WHERE {where}", params)[0][0]
+        stats: Dict[str, Optional[float]] = {'count': count}
+        for p in percentiles:
+            if not count:
+                stats[f'p{p}'] = None
+                continue
+            # 直接按偏移取第k个值, 不把全部样本读入内存
+            offset = _rank_index(p, count)
+            row = self._query(
+                f"SELECT response_time FROM checks WHERE {where} ORDER BY response_time LIMIT 1 OFFSET ?",
+                params + [offset]
+            )
+            stats[f'p{p}'] = row[0][0]
+        return stats
+
+    def latency_by(self, group: str = 'host_id', since: Optional[float] = None,
+                   percentiles: Sequence[int] = (50, 95)) -> Dict[Any, Dict[str, Optional[float]]]:
+        """按主机(group='host_id')或代理端口(group='proxy_port')分组的延迟分位数"""
+        if group not in ('host_id', 'proxy_port'):
+            raise ValueError(f"不支持的分组字段: {group}")
+
+        sql = f"SELECT {group}, response_time FROM checks WHERE success = 1 AND response_time IS NOT NULL"
+        params: List[Any] = []
+        if since is not None:
+            sql += " AND checked_at >= ?"
+            params.append(since)
+        sql += f" ORDER BY {group}, response_time"
+
+        samples: Dict[Any, List[float]] = {}
+        for key, value in self._query(sql, params):
+            samples.setdefault(key, []).append(value)
+
+        stats = {}
+        for key, values in samples.items():
+            entry: Dict[str, Optional[float]] = {'count': len(values)}
+            for p in percentiles:
+                entry[f'p{p}'] = values[_rank_index(p, len(values))]
+            stats[key] = entry
+        return stats
+
+    def flipped_hosts(self, since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        最近一次检测结果与上一次不同的主机 (成功->失败 或 失败->成功)
+
+        Args:
+            since: 只返回最近一次检测在该时间戳之后的主机
+        """
+        sql = """
+            SELECT host_id, ip, port, success, previous_success, checked_at, error FROM (
+                SELECT host_id, ip, port, success, checked_at, error,
+                       LAG(success) OVER (PARTITION BY host_id ORDER BY checked_at) AS previous_success,
+                       ROW_NUMBER() OVER (PARTITION BY host_id ORDER BY checked_at DESC) AS rn
+                FROM checks
+            )
+            WHERE rn = 1 AND previous_success IS NOT NULL AND previous_success != success
+        """
+        params: List[Any] = []
+        if since is not None:
+            sql += " AND checked_at >= ?"
+            params.append(since)
+        sql += " ORDER BY checked_at DESC"
+        return [dict(row) for row in self._query(sql, params)]
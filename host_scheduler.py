@@ -0,0 +1,147 @@
+"""
+按预期耗时调度批量检测顺序
+表格顺序中连续的死主机会占满所有并发槽直到超时。本模块根据历史延迟和失败记录估计每台主机的耗时:
+
+1. 已知正常的主机按延迟从低到高先检测, 尽早产出结果
+2. 从未检测过的主机其次
+3. 最近失败过的主机再次
+4. 连续失败(或目标已熔断)的主机放在最后, 并先做一次廉价的TCP/SOCKS CONNECT探测,
+   不可达时直接判定失败, 不再经历完整的SSH握手超时
+
+同一梯队内按 (代理端口, 子网) 分组交错排列, 避免同一代理或同一机房的主机扎堆
+"""
+
+import heapq
+import ipaddress
+from typing import Optional, Dict, Any, List, Tuple
+
+from batch_journal import host_id
+
+TIER_KNOWN_GOOD = 0
+TIER_UNKNOWN = 1
+TIER_RECENT_FAILURE = 2
+TIER_DEAD = 3
+
+
+def subnet_of(ip: Optional[str], ipv4_prefix: int = 24, ipv6_prefix: int = 64) -> str:
+    """主机所在子网 (域名原样返回)"""
+    try:
+        address = ipaddress.ip_address(ip)
+    except (ValueError, TypeError):
+        return str(ip)
+    prefix = ipv4_prefix if address.version == 4 else ipv6_prefix
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+class HostScheduler:
+    """批量检测调度器"""
+
+    def __init__(self, history=None, timeouts=None, circuit_breaker=None,
+                 dead_after: int = 2, window: int = 5, unknown_cost: float = 5.0,
+                 ipv4_prefix: int = 24, probe_timeout: float = 3.0):
+        """
+        Args:
+            history: HostHistory, 提供跨进程的历史记录
+            timeouts: AdaptiveTimeouts, 提供本进程内最新的延迟估计 (优先于历史记录)
+            circuit_breaker: 目标主机熔断器, 已熔断的主机视为死主机
+            dead_after: 连续失败多少次视为死主机
+            window: 每台主机参考最近多少次检测
+            unknown_cost: 没有任何记录的主机的预估耗时(秒)
+            ipv4_prefix: 交错排列时的IPv4子网前缀长度
+            probe_timeout: 疑似离线主机预探测的超时(秒)
+        """
+        self.history = history
+        self.timeouts = timeouts
+        self.circuit_breaker = circuit_breaker
+        self.dead_after = dead_after
+        self.window = window
+        self.unknown_cost = unknown_cost
+        self.ipv4_prefix = ipv4_prefix
+        self.probe_timeout = probe_timeout
+
+    def estimate(self, vps_info: Dict[str, Any], summary: Optional[Dict[str, Any]]) -> Tuple[int, float]:
+        """(梯队, 预估耗时秒)"""
+        key = (vps_info.get('ip'), vps_info.get('port', 22))
+        latency = None
+        if self.timeouts is not None:
+            snapshot = self.timeouts.snapshot(key)
+            if snapshot['connect_srtt'] is not None:
+                latency = snapshot['connect_srtt'] + (snapshot['command_srtt'] or 0.0)
+        if latency is None and summary:
+            latency = summary['latency']
+
+        if self.circuit_breaker is not None and \
+                self.circuit_breaker.state(('target',) + key) != self.circuit_breaker.CLOSED:
+            return TIER_DEAD, float('inf')
+        if summary is None:
+            return TIER_UNKNOWN, latency if latency is not None else self.unknown_cost
+        if summary['consecutive_failures'] >= self.dead_after:
+            return TIER_DEAD, float('inf')
+        if not summary['last_success']:
+            return TIER_RECENT_FAILURE, latency if latency is not None else self.unknown_cost
+        return TIER_KNOWN_GOOD, latency if latency is not None else self.unknown_cost
+
+    def plan(self, vps_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        生成检测顺序
+
+        Returns:
+            {'order': 输入下标的检测顺序, 'probe_first': 需要先做廉价探测的下标集合,
+             'tiers': 各梯队主机数}
+        """
+        summaries = {}
+        if self.history is not None:
+            summaries = self.history.host_summaries((host_id(v) for v in vps_list), window=self.window)
+
+        tiers: Dict[int, List[Tuple[float, int, Tuple]]] = {}
+        for index, vps_info in enumerate(vps_list):
+            summary = summaries.get(host_id(vps_info))
+            tier, cost = self.estimate(vps_info, summary)
+            group = (summary['proxy_port'] if summary else None,
+                     subnet_of(vps_info.get('ip'), self.ipv4_prefix))
+            tiers.setdefault(tier, []).append((cost, index, group))
+
+        order = []
+        for tier in sorted(tiers):
+            order.extend(self._interleave(tiers[tier]))
+
+        return {
+            'order': order,
+            'probe_first': {index for _, index, _ in tiers.get(TIER_DEAD, [])},
+            'tiers': {
+                'known_good': len(tiers.get(TIER_KNOWN_GOOD, [])),
+                'unknown': len(tiers.get(TIER_UNKNOWN, [])),
+                'recent_failure': len(tiers.get(TIER_RECENT_FAILURE, [])),
+                'dead': len(tiers.get(TIER_DEAD, [])),
+            },
+        }
+
+    @staticmethod
+    def _interleave(entries: List[Tuple[float, int, Tuple]]) -> List[int]:
+        """按预估耗时从低到高排列, 相邻两台尽量不属于同一分组"""
+        groups: Dict[Tuple, List[Tuple[float, int]]] = {}
+        for cost, index, group in sorted(entries, key=lambda e: (e[0], e[1])):
+            groups.setdefault(group, []).append((cost, index))
+
+        heap = [(members[0][0], members[0][1], position, group)
+                for position, (group, members) in enumerate(groups.items())]
+        heapq.heapify(heap)
+        cursors = {group: 0 for group in groups}
+
+        order = []
+        last_group = None
+        while heap:
+            entry = heapq.heappop(heap)
+            if entry[3] == last_group and heap:
+                # 换一个分组, 刚才的分组放回堆中
+                entry = heapq.heapreplace(heap, entry)
+            _, index, position, group = entry
+            order.append(index)
+            last_group = group
+
+            cursors[group] += 1
+            members = groups[group]
+            if cursors[group] < len(members):
+                cost, next_index = members[cursors[group]]
+                heapq.heappush(heap, (cost, next_index, position, group))
+        return order
@@ -0,0 +1,272 @@
+"""
+批量任务进度事件总线
+批量引擎对每台主机发出 started / phase / completed / failed 事件, 总线只做计数,
+按固定频率 (默认10Hz) 把期间的变化合并为一份快照交给订阅者 (GUI进度条、ExcelManager的status_callback等)。
+界面刷新次数只与运行时长有关, 与主机数量无关
+
+用法:
+    progress = ProgressBus(rate_hz=10)
+    progress.subscribe(lambda snapshot: print(snapshot['completed'], snapshot['eta']))
+    await manager.test_multiple_vps(vps_list, progress=progress)
+
+Tk等非线程安全的界面也可以不订阅, 在界面线程中用 after() 定时读取 progress.latest()
+"""
+
+import asyncio
+import inspect
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List, Callable
+
+from batch_journal import host_id
+
+STARTED = 'started'
+PHASE = 'phase'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+SnapshotCallback = Callable[[Dict[str, Any]], Any]
+
+
+class ProgressEvent:
+    """单台主机的进度事件"""
+
+    __slots__ = ('kind', 'host', 'phase', 'result', 'at')
+
+    def __init__(self, kind: str, host: str, phase: Optional[str] = None,
+                 result: Optional[Dict[str, Any]] = None, at: Optional[float] = None):
+        self.kind = kind
+        self.host = host
+        self.phase = phase
+        self.result = result
+        self.at = at if at is not None else time.monotonic()
+
+    def as_dict(self) -> Dict[str, Any]:
+        event = {'kind': self.kind, 'host': self.host, 'phase': self.phase}
+        if self.result is not None:
+            event['success'] = bool(self.result.get('success'))
+            event['error'] = self.result.get('error')
+        return event
+
+    def __repr__(self):
+        return f"ProgressEvent({self.kind!r}, {self.host!r}, phase={self.phase!r})"
+
+
+class ProgressBus:
+    """合并进度事件并限频推送快照"""
+
+    def __init__(self, rate_hz: float = 10.0, rate_window: float = 10.0, max_events: int = 50):
+        """
+        Args:
+            rate_hz: 每秒最多推送多少次快照
+            rate_window: 计算完成速率的滑动窗口(秒)
+            max_events: 每份快照最多附带多少条期间发生的事件, 超出部分只计数 (events_dropped)
+        """
+        if rate_hz <= 0:
+            raise ValueError("rate_hz 必须大于0")
+        self.interval = 1.0 / rate_hz
+        self.rate_window = rate_window
+        self.max_events = max_events
+        self._subscribers: List[SnapshotCallback] = []
+        self._lock = threading.Lock()
+        self._pump: Optional[asyncio.Task] = None
+        self._latest: Optional[Dict[str, Any]] = None
+        self._latest_at = 0.0
+        self._reset(None)
+
+    def _reset(self, total: Optional[int]):
+        self.total = total
+        self.started_at = time.monotonic()
+        self.counts = {'started': 0, 'completed': 0, 'success': 0, 'failed': 0,
+                       'cancelled': 0, 'not_attempted': 0, 'timed_out': 0}
+        self._phases: Dict[int, str] = {}
+        self._events: List[ProgressEvent] = []
+        self._dropped = 0
+        self._current: Optional[str] = None
+        self._samples = deque([(self.started_at, 0)])
+        self._dirty = True
+        self._running = False
+
+    # ---- 订阅 ----
+
+    def subscribe(self, callback: SnapshotCallback):
+        """订阅快照, callback(snapshot) 可以是普通函数或协程函数, 在事件循环线程中调用"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: SnapshotCallback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """最近一份快照 (线程安全, 供界面线程轮询)"""
+        with self._lock:
+            return self._latest
+
+    # ---- 批量引擎调用 ----
+
+    def begin(self, total: Optional[int] = None):
+        """批量任务开始 (total为主机总数, 未知时为None), 在事件循环中启动定时推送"""
+        with self._lock:
+            self._reset(total)
+            self._running = True
+        self._pump = asyncio.get_running_loop().create_task(self._run())
+
+    async def end(self):
+        """批量任务结束, 推送最终快照 (done=True)"""
+        with self._lock:
+            self._running = False
+        if self._pump is not None:
+            self._pump.cancel()
+            try:
+                await self._pump
+            except asyncio.CancelledError:
+                pass
+            self._pump = None
+        await self._deliver(final=True)
+
+    def started(self, vps_info: Dict[str, Any]):
+        self.emit(ProgressEvent(STARTED, host_id(vps_info)), key=id(vps_info))
+
+    def phase(self, vps_info: Dict[str, Any], phase: str):
+        self.emit(ProgressEvent(PHASE, host_id(vps_info), phase=phase), key=id(vps_info))
+
+    def finished(self, result: Any, vps_info: Optional[Dict[str, Any]] = None):
+        """主机完成 (成功为completed, 其余为failed)"""
+        if not isinstance(result, dict):
+            result = {'vps_info': vps_info or {}, 'success': False, 'error': str(result)}
+        vps_info = vps_info if vps_info is not None else (result.get('vps_info') or {})
+        kind = COMPLETED if result.get('success') else FAILED
+        self.emit(ProgressEvent(kind, host_id(vps_info), result=result), key=id(vps_info))
+
+    def emit(self, event: ProgressEvent, key: Optional[int] = None):
+        """记录一个事件 (只更新计数, 不触发界面刷新)"""
+        key = key if key is not None else hash(event.host)
+        with self._lock:
+            if event.kind == STARTED:
+                self.counts['started'] += 1
+                self._phases[key] = 'connect'
+                self._current = event.host
+            elif event.kind == PHASE:
+                self._phases[key] = event.phase
+            else:
+                self._phases.pop(key, None)
+                self.counts['completed'] += 1
+                if event.kind == COMPLETED:
+                    self.counts['success'] += 1
+                else:
+                    self.counts['failed'] += 1
+                    for status in ('cancelled', 'not_attempted', 'timed_out'):
+                        if event.result and event.result.get(status):
+                            self.counts[status] += 1
+                            break
+
+            if len(self._events) < self.max_events:
+                self._events.append(event)
+            else:
+                self._dropped += 1
+            self._dirty = True
+
+    # ---- 快照 ----
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        当前进度快照
+
+        Returns:
+            {'total', 'started', 'in_flight', 'completed', 'success', 'failed', 'cancelled',
+             'not_attempted', 'timed_out', 'phases'(各阶段中的主机数), 'current'(最近开始的主机),
+             'elapsed', 'rate'(台/秒, 最近 rate_window 秒), 'eta'(秒, 无法估计时为None), 'percent',
+             'events'(自上次快照以来的事件), 'events_dropped', 'done'}
+        """
+        with self._lock:
+            return self._build_snapshot(time.monotonic(), drain=False)
+
+    def _build_snapshot(self, now: float, drain: bool) -> Dict[str, Any]:
+        completed = self.counts['completed']
+        samples = self._samples
+        if drain:
+            samples.append((now, completed))
+            while len(samples) > 2 and now - samples[1][0] >= self.rate_window:
+                samples.popleft()
+        then, completed_then = samples[0]
+        rate = (completed - completed_then) / (now - then) if now > then else 0.0
+
+        eta = None
+        percent = None
+        if self.total is not None:
+            remaining = max(0, self.total - completed)
+            percent = round(completed / self.total * 100, 1) if self.total else 100.0
+            if remaining == 0:
+                eta = 0.0
+            elif rate > 0:
+                eta = round(remaining / rate, 1)
+
+        phases: Dict[str, int] = {}
+        for phase in self._phases.values():
+            phases[phase] = phases.get(phase, 0) + 1
+
+        events = [event.as_dict() for event in self._events]
+        dropped = self._dropped
+        if drain:
+            self._events = []
+            self._dropped = 0
+
+        return dict(
+            self.counts,
+            total=self.total,
+            in_flight=len(self._phases),
+            phases=phases,
+            current=self._current,
+            elapsed=round(now - self.started_at, 2),
+            rate=round(rate, 2),
+            eta=eta,
+            percent=percent,
+            events=events,
+            events_dropped=dropped,
+            done=not self._running,
+        )
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._deliver()
+
+    async def _deliver(self, final: bool = False):
+        with self._lock:
+            if not self._dirty and not final:
+                # 没有新事件时仍按较低频率刷新, 让耗时和ETA保持更新
+                if self._latest is not None and time.monotonic() - self._latest_at < 1.0:
+                    return
+            self._dirty = False
+            now = time.monotonic()
+            snapshot = self._build_snapshot(now, drain=True)
+            self._latest = snapshot
+            self._latest_at = now
+
+        for callback in list(self._subscribers):
+            try:
+                outcome = callback(snapshot)
+                if inspect.isawaitable(outcome):
+                    await outcome
+            except Exception as e:
+                print(f"⚠️ 进度回调出错: {e}")
+
+
+def status_kwargs(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把快照转换为 ExcelManager / GUI 现有 status_callback(**kwargs) 使用的字段,
+    如 progress.subscribe(lambda s: status_callback(**status_kwargs(s)))
+    """
+    return {
+        'is_running': not snapshot['done'],
+        'current_vps': snapshot['current'],
+        'completed_count': snapshot['completed'],
+        'total_count': snapshot['total'],
+        'success_count': snapshot['success'],
+        'failed_count': snapshot['failed'],
+        'progress': snapshot['percent'],
+        'elapsed': snapshot['elapsed'],
+        'rate': snapshot['rate'],
+        'eta': snapshot['eta'],
+    }
@@ -0,0 +1,241 @@
+"""
+进程级代理发现缓存
+所有AsyncSSHClient共享一次代理端口探测结果, 避免批量检测时每台VPS重复扫描
+
+特点:
+1. 探测结果按TTL缓存, 失败结果使用更短的TTL
+2. 缓存接近过期时返回旧值并在后台重新验证
+3. 并发查询合并为同一次探测
+
+ProxyBalancer 在多个本地SOCKS代理端口之间分配连接
+"""
+
+import asyncio
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, Awaitable, Hashable, Iterable, List, Tuple, Union
+
+
+class ProxyRegistry:
+    """代理发现结果注册表"""
+
+    def __init__(self, ttl: float = 300.0, negative_ttl: float = 15.0, refresh_ratio: float = 0.8):
+        """
+        Args:
+            ttl: 可用代理端口的缓存时间(秒)
+            negative_ttl: "未找到可用代理" 结果的缓存时间(秒)
+            refresh_ratio: 缓存年龄超过 TTL*refresh_ratio 后触发后台重新验证
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_ratio = refresh_ratio
+        self._entries: Dict[Hashable, Dict[str, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def peek(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """查看缓存条目 (不触发探测)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry else None
+
+    def store(self, key: Hashable, port: Optional[int], **info):
+        """写入探测结果"""
+        now = time.monotonic()
+        healthy = port is not None
+        entry = {
+            'port': port,
+            'healthy': healthy,
+            'checked_at': now,
+            'expires_at': now + (self.ttl if healthy else self.negative_ttl),
+        }
+        entry.update(info)
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """使缓存失效 (key为None时清空全部)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    async def lookup(self, key: Hashable,
+                     discover: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        获取缓存条目, 必要时执行探测
+
+        Args:
+            key: 缓存键 (通常为 代理主机+首选端口+是否自动检测)
+            discover: 实际执行探测的协程函数, 返回 {'port': 可用端口或None, ...附加健康信息}
+        """
+        entry = self.peek(key)
+        now = time.monotonic()
+
+        if entry and now < entry['expires_at']:
+            lifetime = entry['expires_at'] - entry['checked_at']
+            if now - entry['checked_at'] >= lifetime * self.refresh_ratio:
+                self._probe(key, discover)
+            return entry
+
+        # shield: 单个调用方被取消不会中断其他调用方共享的探测
+        return dict(await asyncio.shield(self._probe(key, discover)))
+
+    async def get_port(self, key: Hashable,
+                       discover: Callable[[], Awaitable[Dict[str, Any]]]) -> Optional[int]:
+        """获取代理端口 (参数同 lookup)"""
+        return (await self.lookup(key, discover))['port']
+
+    def _probe(self, key: Hashable, discover) -> asyncio.Task:
+        """启动(或复用)一次探测, 同一事件循环内的并发请求共享结果"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._inflight.get(key)
+            if task is not None and not task.done() and task.get_loop() is loop:
+                return task
+
+            task = loop.create_task(self._run_discovery(key, discover))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+        return task
+
+    async def _run_discovery(self, key: Hashable, discover) -> Dict[str, Any]:
+        try:
+            result = dict(await discover())
+            return self.store(key, result.pop('port', None), **result)
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is asyncio.current_task():
+                    del self._inflight[key]
+
+
+def _consume_exception(task: asyncio.Task):
+    """后台刷新无人等待时, 避免 "exception was never retrieved" 警告"""
+    if not task.cancelled():
+        task.exception()
+
+
+class ProxyBalancer:
+    """
+    多代理端口负载均衡
+
+    策略:
+        round_robin: 依次轮换
+        least_outstanding: 选择当前使用中连接数最少的代理
+        lowest_latency: 选择连接耗时(EWMA)最低的代理, 没有样本的代理优先试用
+    """
+
+    ROUND_ROBIN = 'round_robin'
+    LEAST_OUTSTANDING = 'least_outstanding'
+    LOWEST_LATENCY = 'lowest_latency'
+    POLICIES = (ROUND_ROBIN, LEAST_OUTSTANDING, LOWEST_LATENCY)
+
+    LATENCY_ALPHA = 0.2
+
+    def __init__(self, endpoints: Iterable[Union[int, Tuple[str, int]]], policy: str = LEAST_OUTSTANDING,
+                 max_per_proxy: Optional[int] = None, proxy_host: str = '127.0.0.1', circuit_breaker=None):
+        """
+        Args:
+            endpoints: 代理端口或 (host, port) 列表
+            policy: 分配策略, 见 POLICIES
+            max_per_proxy: 每个代理同时建立中/使用中的连接上限 (None为不限制)
+            proxy_host: endpoints只给端口时使用的代理主机
+            circuit_breaker: 代理熔断器, 处于打开状态的代理不参与分配
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的负载均衡策略: {policy}")
+
+        self.endpoints: List[Tuple[str, int]] = [
+            (proxy_host, ep) if isinstance(ep, int) else (ep[0], int(ep[1])) for ep in endpoints
+        ]
+        if not self.endpoints:
+            raise ValueError("至少需要一个代理端口")
+
+        self.policy = policy
+        self.max_per_proxy = max_per_proxy
+        self.circuit_breaker = circuit_breaker
+        self.outstanding: Dict[Tuple[str, int], int] = {ep: 0 for ep in self.endpoints}
+        self.latency: Dict[Tuple[str, int], Optional[float]] = {ep: None for ep in self.endpoints}
+        self._next = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._condition_loop = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._condition_loop is not loop:
+            self._condition = asyncio.Condition()
+            self._condition_loop = loop
+        return self._condition
+
+    def _is_open(self, endpoint: Tuple[str, int]) -> bool:
+        if self.circuit_breaker is None:
+            return False
+        return self.circuit_breaker.state(('proxy',) + endpoint) == self.circuit_breaker.OPEN
+
+    def _candidates(self) -> List[Tuple[str, int]]:
+        """可分配的代理 (按轮转起点排序), 全部熔断时仍返回全部, 交由调用方快速失败"""
+        count = len(self.endpoints)
+        ordered = [self.endpoints[(self._next + i) % count] for i in range(count)]
+        healthy = [ep for ep in ordered if not self._is_open(ep)] or ordered
+        if self.max_per_proxy is None:
+            return healthy
+        return [ep for ep in healthy if self.outstanding[ep] < self.max_per_proxy]
+
+    def _choose(self, candidates: List[Tuple[str, int]]) -> Tuple[str, int]:
+        if self.policy == self.LEAST_OUTSTANDING:
+            endpoint = min(candidates, key=lambda ep: self.outstanding[ep])
+        elif self.policy == self.LOWEST_LATENCY:
+            endpoint = min(candidates, key=lambda ep: (self.latency[ep] or 0.0, self.outstanding[ep]))
+        else:
+            endpoint = candidates[0]
+        self._next = (self.endpoints.index(endpoint) + 1) % len(self.endpoints)
+        return endpoint
+
+    async def acquire(self) -> Tuple[str, int]:
+        """按策略选择代理并占用一个名额, 所有代理都达到上限时等待"""
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                candidates = self._candidates()
+                if candidates:
+                    endpoint = self._choose(candidates)
+                    self.outstanding[endpoint] += 1
+                    return endpoint
+                await condition.wait()
+
+    def track(self, endpoint: Tuple[str, int]):
+        """登记一个已存在的连接(如连接池复用的会话), 不受上限约束"""
+        if endpoint in self.outstanding:
+            self.outstanding[endpoint] += 1
+
+    def record_latency(self, endpoint: Tuple[str, int], seconds: float):
+        """记录经该代理建立连接的耗时(秒)"""
+        if endpoint not in self.latency:
+            return
+        previous = self.latency[endpoint]
+        self.latency[endpoint] = seconds if previous is None else \
+            (1 - self.LATENCY_ALPHA) * previous + self.LATENCY_ALPHA * seconds
+
+    async def release(self, endpoint: Tuple[str, int]):
+        """归还名额"""
+        if endpoint not in self.outstanding:
+            return
+
+        condition = self._get_condition()
+        async with condition:
+            self.outstanding[endpoint] -= 1
+            condition.notify()
+
+    def stats(self) -> Dict[Tuple[str, int], Dict[str, Any]]:
+        return {ep: {'outstanding': self.outstanding[ep], 'latency': self.latency[ep],
+                     'open': self._is_open(ep)} for ep in self.endpoints}
+
+
+_default_registry = ProxyRegistry()
+
+
+def get_proxy_registry() -> ProxyRegistry:
+    """获取进程共享的默认注册表"""
+    return _default_registry
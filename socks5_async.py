@@ -0,0 +1,353 @@
+"""
+原生asyncio SOCKS5客户端
+替代 PySocks + 线程池 的阻塞式代理连接
+
+特点:
+1. 握手全程运行在事件循环上, 不占用执行器线程
+2. 支持无认证和用户名/密码认证 (RFC 1928 / RFC 1929)
+3. 握手完成后直接把transport交给asyncssh接管
+4. 并发端口扫描, 用于发现本地活跃代理端口
+5. 协议级健康探测, 不依赖任何第三方网站
+"""
+
+import asyncio
+import ipaddress
+import struct
+import time
+from typing import Optional, Tuple, Callable, Iterable, List, Dict, Any
+
+
+SOCKS5_VERSION = 0x05
+AUTH_NONE = 0x00
+AUTH_USERPASS = 0x02
+AUTH_NO_ACCEPTABLE = 0xFF
+CMD_CONNECT = 0x01
+ATYP_IPV4 = 0x01
+ATYP_DOMAIN = 0x03
+ATYP_IPV6 = 0x04
+
+_REPLY_MESSAGES = {
+    0x01: '代理服务器一般性故障',
+    0x02: '代理规则不允许该连接',
+    0x03: '网络不可达',
+    0x04: '主机不可达',
+    0x05: '目标拒绝连接',
+    0x06: 'TTL已过期',
+    0x07: '不支持的命令',
+    0x08: '不支持的地址类型',
+}
+
+
+class Socks5Error(Exception):
+    """SOCKS5握手失败"""
+
+
+class ProxyUnreachableError(Socks5Error):
+    """无法连接到代理服务器本身 (端口关闭或代理进程退出)"""
+
+
+class Socks5ConnectError(Socks5Error):
+    """代理正常应答, 但CONNECT被拒绝 (reply为REP错误码), 问题在目标一侧"""
+
+    def __init__(self, message: str, reply: int):
+        super().__init__(message)
+        self.reply = reply
+
+
+def encode_address(host: str, port: int) -> bytes:
+    """编码CONNECT请求中的目标地址 (域名交给代理解析, 等价于socks5h)"""
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        name = host.encode('idna')
+        if len(name) > 255:
+            raise Socks5Error(f"目标域名过长: {host}")
+        return bytes([ATYP_DOMAIN, len(name)]) + name + struct.pack('!H', port)
+
+    atyp = ATYP_IPV4 if ip.version == 4 else ATYP_IPV6
+    return bytes([atyp]) + ip.packed + struct.pack('!H', port)
+
+
+class _Socks5HandshakeProtocol(asyncio.Protocol):
+    """SOCKS5握手状态机, 完成后暂停读取等待移交transport"""
+
+    def __init__(self, target_host: str, target_port: int,
+                 username: Optional[str], password: Optional[str],
+                 waiter: asyncio.Future):
+        self.target_host = target_host
+        self.target_port = target_port
+        self.username = username
+        self.password = password
+        self.waiter = waiter
+        self.transport = None
+        self._buffer = bytearray()
+        self._state = 'greeting'
+
+    def connection_made(self, transport):
+        self.transport = transport
+        methods = [AUTH_NONE]
+        if self.username is not None:
+            methods.append(AUTH_USERPASS)
+        transport.write(bytes([SOCKS5_VERSION, len(methods)]) + bytes(methods))
+
+    def data_received(self, data: bytes):
+        self._buffer.extend(data)
+        try:
+            self._advance()
+        except Socks5Error as e:
+            self._fail(e)
+
+    def connection_lost(self, exc):
+        if not self.waiter.done():
+            self.waiter.set_exception(Socks5Error(f"代理在握手阶段关闭连接: {exc or 'EOF'}"))
+
+    def _fail(self, exc: Exception):
+        if not self.waiter.done():
+            self.waiter.set_exception(exc)
+        self.transport.close()
+
+    def _send_connect(self):
+        request = bytes([SOCKS5_VERSION, CMD_CONNECT, 0x00])
+        self.transport.write(request + encode_address(self.target_host, self.target_port))
+        self._state = 'connect'
+
+    def _advance(self):
+        while True:
+            if self._state == 'greeting':
+                if len(self._buffer) < 2:
+                    return
+                version, method = self._buffer[0], self._buffer[1]
+                del self._buffer[:2]
+                if version != SOCKS5_VERSION:
+                    raise Socks5Error(f"代理返回了非SOCKS5响应: 0x{version:02x}")
+                if method == AUTH_NONE:
+                    self._send_connect()
+                elif method == AUTH_USERPASS and self.username is not None:
+                    user = self.username.encode('utf-8')
+                    pwd = (self.password or '').encode('utf-8')
+                    if len(user) > 255 or len(pwd) > 255:
+                        raise Socks5Error("代理用户名或密码过长")
+                    self.transport.write(bytes([0x01, len(user)]) + user + bytes([len(pwd)]) + pwd)
+                    self._state = 'auth'
+                else:
+                    raise Socks5Error("代理不接受任何可用的认证方式")
+
+            elif self._state == 'auth':
+                if len(self._buffer) < 2:
+                    return
+                status = self._buffer[1]
+                del self._buffer[:2]
+                if status != 0x00:
+                    raise Socks5Error("代理用户名/密码认证失败")
+                self._send_connect()
+
+            elif self._state == 'connect':
+                # VER REP RSV ATYP BND.ADDR BND.PORT
+                if len(self._buffer) < 5:
+                    return
+                version, reply, _, atyp = self._buffer[:4]
+                if version != SOCKS5_VERSION:
+                    raise Socks5Error(f"代理返回了非SOCKS5响应: 0x{version:02x}")
+                if reply != 0x00:
+                    message = _REPLY_MESSAGES.get(reply, f'未知错误码 0x{reply:02x}')
+                    raise Socks5ConnectError(f"代理CONNECT失败: {message}", reply)
+                if atyp == ATYP_IPV4:
+                    length = 4 + 4 + 2
+                elif atyp == ATYP_IPV6:
+                    length = 4 + 16 + 2
+                elif atyp == ATYP_DOMAIN:
+                    length = 4 + 1 + self._buffer[4] + 2
+                else:
+                    raise Socks5Error(f"代理返回了未知地址类型: 0x{atyp:02x}")
+                if len(self._buffer) < length:
+                    return
+                del self._buffer[:length]
+                self._state = 'done'
+                self.transport.pause_reading()
+                self.waiter.set_result(bytes(self._buffer))
+                return
+
+            else:
+                return
+
+
+async def socks5_handshake(proxy_host: str, proxy_port: int,
+                           target_host: str, target_port: int,
+                           username: Optional[str] = None,
+                           password: Optional[str] = None) -> Tuple[asyncio.Transport, bytes]:
+    """
+    通过SOCKS5代理建立到目标的隧道
+
+    Returns:
+        Tuple[transport, leftover]: 已暂停读取的transport, 以及握手响应之后已收到的数据
+    """
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+    try:
+        transport, _ = await loop.create_connection(
+            lambda: _Socks5HandshakeProtocol(target_host, target_port, username, password, waiter),
+            proxy_host, proxy_port
+        )
+    except OSError as e:
+        raise ProxyUnreachableError(f"无法连接代理 {proxy_host}:{proxy_port}: {e}") from e
+    try:
+        leftover = await waiter
+    except BaseException:
+        transport.close()
+        raise
+    return transport, leftover
+
+
+def attach_protocol(transport: asyncio.Transport, protocol_factory: Callable[[], asyncio.Protocol],
+                    leftover: bytes = b'') -> asyncio.Protocol:
+    """把握手完成的transport移交给新的协议对象"""
+    protocol = protocol_factory()
+    transport.set_protocol(protocol)
+    protocol.connection_made(transport)
+    if leftover:
+        protocol.data_received(leftover)
+    transport.resume_reading()
+    return protocol
+
+
+async def open_socks5_connection(proxy_host: str, proxy_port: int,
+                                 target_host: str, target_port: int,
+                                 protocol_factory: Callable[[], asyncio.Protocol],
+                                 username: Optional[str] = None,
+                                 password: Optional[str] = None,
+                                 timeout: Optional[float] = None) -> Tuple[asyncio.Transport, asyncio.Protocol]:
+    """与 loop.create_connection 用法一致, 但经由SOCKS5代理连接"""
+    transport, leftover = await asyncio.wait_for(
+        socks5_handshake(proxy_host, proxy_port, target_host, target_port, username, password),
+        timeout=timeout
+    )
+    return transport, attach_protocol(transport, protocol_factory, leftover)
+
+
+class Socks5Tunnel:
+    """
+    供 asyncssh.connect(tunnel=...) 使用的SOCKS5隧道
+
+    asyncssh会调用 create_connection(session_factory, host, port),
+    握手完成后的transport直接交给SSH连接对象, 不经过任何线程
+    """
+
+    def __init__(self, proxy_host: str, proxy_port: int,
+                 username: Optional[str] = None, password: Optional[str] = None,
+                 timeout: Optional[float] = None):
+        self.proxy_host = proxy_host
+        self.proxy_port = proxy_port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+
+    async def create_connection(self, session_factory, remote_host: str, remote_port: int):
+        return await open_socks5_connection(
+            self.proxy_host, self.proxy_port, remote_host, remote_port,
+            session_factory, self.username, self.password, self.timeout
+        )
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+    def __str__(self):
+        return f"socks5://{self.proxy_host}:{self.proxy_port}"
+
+
+async def _is_port_open(host: str, port: int, timeout: float, semaphore: asyncio.Semaphore) -> bool:
+    async with semaphore:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+
+
+async def scan_open_ports(host: str, ports: Iterable[int], timeout: float = 1.0,
+                          max_concurrent: int = 256) -> List[int]:
+    """
+    并发探测TCP端口, 所有端口同时发起连接, 总耗时约为一次RTT (最多一个timeout)
+
+    Args:
+        host: 目标主机
+        ports: 端口列表或范围, 如 range(1080, 1181)
+        timeout: 单个端口的连接超时(秒)
+        max_concurrent: 同时进行的连接数上限 (避免大范围扫描耗尽文件描述符)
+
+    Returns:
+        List[int]: 可连接的端口, 保持输入顺序
+    """
+    ports = list(dict.fromkeys(ports))
+    semaphore = asyncio.Semaphore(max_concurrent)
+    results = await asyncio.gather(*(_is_port_open(host, port, timeout, semaphore) for port in ports))
+    return [port for port, is_open in zip(ports, results) if is_open]
+
+
+class Socks5HealthProbe:
+    """
+    SOCKS5协议级健康探测
+
+    完成问候(及认证)并对指定目标的CONNECT给出应答即视为健康, 报告握手延迟(毫秒)。
+    代理的健康与目标是否可达无关: CONNECT被拒绝(REP≠0)同样说明代理工作正常,
+    CONNECT超时时再单独验证SOCKS5问候; 结果中的 target_reachable 表示目标是否可达。
+    未指定目标时只验证代理能正确应答SOCKS5问候。
+    任何 async (proxy_host, proxy_port) -> dict 的可调用对象都可以替代本类。
+    """
+
+    def __init__(self, target_host: Optional[str] = None, target_port: int = 22,
+                 timeout: float = 3.0, username: Optional[str] = None,
+                 password: Optional[str] = None):
+        self.target_host = target_host
+        self.target_port = target_port
+        self.timeout = timeout
+        self.username = username
+        self.password = password
+
+    async def __call__(self, proxy_host: str, proxy_port: int) -> Dict[str, Any]:
+        start = time.monotonic()
+        target_reachable = True if self.target_host else None
+        try:
+            await asyncio.wait_for(self._handshake(proxy_host, proxy_port), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            if not self.target_host:
+                return {'healthy': False, 'latency_ms': None, 'error': f'握手超时 ({self.timeout}s)'}
+            # 目标不通时代理可能一直等待CONNECT结果, 单独验证代理本身
+            greeting = await Socks5HealthProbe(timeout=self.timeout, username=self.username,
+                                               password=self.password)(proxy_host, proxy_port)
+            greeting['target_reachable'] = False if greeting['healthy'] else None
+            return greeting
+        except Socks5ConnectError:
+            target_reachable = False
+        except (OSError, Socks5Error) as e:
+            return {'healthy': False, 'latency_ms': None, 'error': str(e)}
+
+        return {'healthy': True, 'latency_ms': round((time.monotonic() - start) * 1000, 2), 'error': None,
+                'target_reachable': target_reachable}
+
+    async def _handshake(self, proxy_host: str, proxy_port: int):
+        if self.target_host:
+            transport, _ = await socks5_handshake(proxy_host, proxy_port, self.target_host, self.target_port,
+                                                  self.username, self.password)
+            transport.close()
+            return
+
+        try:
+            reader, writer = await asyncio.open_connection(proxy_host, proxy_port)
+        except OSError as e:
+            raise ProxyUnreachableError(f"无法连接代理 {proxy_host}:{proxy_port}: {e}") from e
+        try:
+            writer.write(bytes([SOCKS5_VERSION, 1, AUTH_USERPASS if self.username is not None else AUTH_NONE]))
+            try:
+                version, method = await reader.readexactly(2)
+            except asyncio.IncompleteReadError:
+                raise Socks5Error("代理在握手阶段关闭连接")
+            if version != SOCKS5_VERSION:
+                raise Socks5Error(f"代理返回了非SOCKS5响应: 0x{version:02x}")
+            if method == AUTH_NO_ACCEPTABLE:
+                raise Socks5Error("代理不接受任何可用的认证方式")
+        finally:
+            writer.close()
@@ -0,0 +1,235 @@
+"""
+SSH连接池
+按 (ip, port, username, proxy) 复用已认证的asyncssh会话,
+批量检测之后的部署/命令执行无需再次经历 SOCKS握手 + 密钥交换 + 认证
+
+特点:
+1. 每台主机的最大连接数限制
+2. 空闲连接超时回收, 空闲连接总数超过 max_idle 时按LRU关闭最久未用的连接
+3. 取出连接时做健康检查, 失效连接自动丢弃并重连
+"""
+
+import asyncio
+import time
+from collections import deque, OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, Callable, Awaitable, Hashable
+
+
+class SSHConnectionPool:
+    """AsyncSSHClient连接池"""
+
+    def __init__(self, max_per_host: int = 4, idle_timeout: float = 120.0,
+                 keepalive_interval: Optional[float] = 30.0, health_check_after: float = 15.0,
+                 health_check_timeout: float = 5.0, max_idle: int = 64):
+        """
+        Args:
+            max_per_host: 每个键(主机)同时存在的最大连接数
+            max_idle: 整个池的空闲连接总数上限, 超出时关闭最久未使用的连接 (控制文件描述符和内存)
+            idle_timeout: 空闲连接保留时间(秒), 超时后关闭
+            keepalive_interval: SSH层keepalive间隔(秒), 由连接工厂传给asyncssh
+            health_check_after: 连接空闲超过该时间后, 取出时先执行一次探活命令
+            health_check_timeout: 探活命令超时(秒)
+        """
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.health_check_after = health_check_after
+        self.health_check_timeout = health_check_timeout
+        self.max_idle = max_idle
+        self._hosts: Dict[Hashable, Dict[str, Any]] = {}
+        # 全部空闲连接按归还时间排序 (LRU): id(client) -> key
+        self._idle_order: 'OrderedDict[int, Hashable]' = OrderedDict()
+        # 使用中的连接 -> 取出时占用的主机状态 (归还时必须还给同一个状态的信号量)
+        self._leases: Dict[int, Dict[str, Any]] = {}
+        self._loop = None
+        self._last_sweep = time.monotonic()
+        self.stats = {'created': 0, 'reused': 0, 'discarded': 0, 'evicted': 0}
+
+    def _host_state(self, key: Hashable) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 连接属于已结束的事件循环 (如GUI多次 asyncio.run), 无法复用
+            self._hosts.clear()
+            self._idle_order.clear()
+            self._leases.clear()
+            self._loop = loop
+
+        state = self._hosts.get(key)
+        if state is None:
+            state = {'idle': deque(), 'in_use': 0, 'waiting': 0,
+                     'slots': asyncio.Semaphore(self.max_per_host)}
+            self._hosts[key] = state
+        return state
+
+    @staticmethod
+    def _is_alive(client) -> bool:
+        connection = client.connection
+        return connection is not None and not connection.is_closed()
+
+    async def _check_health(self, client) -> bool:
+        try:
+            _, _, exit_code = await client.execute_command('true', timeout=self.health_check_timeout)
+            return exit_code == 0
+        except Exception:
+            return False
+
+    async def acquire(self, key: Hashable, connect: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """
+        取出一个可用连接, 没有空闲连接时调用 connect() 新建
+
+        Returns:
+            已连接的客户端; connect() 返回None(连接失败)时返回None
+        """
+        state = self._host_state(key)
+        state['waiting'] += 1
+        try:
+            await state['slots'].acquire()
+        except BaseException:
+            state['waiting'] -= 1
+            self._drop_if_unused(key, state)
+            raise
+        state['waiting'] -= 1
+        state['in_use'] += 1
+
+        try:
+            while state['idle']:
+                client, idle_since = state['idle'].pop()
+                self._idle_order.pop(id(client), None)
+                if self._is_alive(client) and (
+                        time.monotonic() - idle_since < self.health_check_after or
+                        await self._check_health(client)):
+                    client.reused = True
+                    self.stats['reused'] += 1
+                    self._leases[id(client)] = state
+                    return client
+                self.stats['discarded'] += 1
+                await self._close_client(client)
+
+            client = await connect()
+        except BaseException:
+            self._return_slot(key, state)
+            raise
+
+        if client is None:
+            self._return_slot(key, state)
+            return None
+
+        client.reused = False
+        self.stats['created'] += 1
+        self._leases[id(client)] = state
+        return client
+
+    async def release(self, key: Hashable, client, discard: bool = False):
+        """归还连接, discard=True 或连接已断开时直接关闭"""
+        state = self._leases.pop(id(client), None)
+        if state is None:
+            # 不是从本池取出的连接, 直接关闭
+            await self._close_client(client)
+            return
+
+        if self._hosts.get(key) is not state:
+            # 池已重置(事件循环切换或关闭), 直接关闭
+            await self._close_client(client)
+        elif discard or not self._is_alive(client):
+            self.stats['discarded'] += 1
+            await self._close_client(client)
+        else:
+            state['idle'].append((client, time.monotonic()))
+            self._idle_order[id(client)] = key
+        self._return_slot(key, state)
+        await self._evict_lru()
+        await self._evict_idle()
+
+    @asynccontextmanager
+    async def connection(self, key: Hashable, connect: Callable[[], Awaitable[Optional[Any]]],
+                         keep: bool = True):
+        """
+        以上下文管理器形式使用连接, 块内抛出异常时丢弃该连接
+        keep=False 时新建的连接用完即关闭, 不放入池中 (从池中取出的连接照常归还)
+
+        用法:
+            async with pool.connection(key, connect) as client:
+                if client: ...
+        """
+        client = await self.acquire(key, connect)
+        if client is None:
+            yield None
+            return
+
+        discard = not keep and not client.reused
+        try:
+            yield client
+        except BaseException:
+            discard = True
+            raise
+        finally:
+            await self.release(key, client, discard=discard)
+
+    def _return_slot(self, key: Hashable, state: Dict[str, Any]):
+        state['in_use'] -= 1
+        state['slots'].release()
+        self._drop_if_unused(key, state)
+
+    def _drop_if_unused(self, key: Hashable, state: Dict[str, Any]):
+        """主机状态没有使用中/空闲的连接, 也没有协程在等待名额时才删除"""
+        if state['in_use'] == 0 and not state['idle'] and state['waiting'] == 0 \
+                and not state['slots'].locked() and self._hosts.get(key) is state:
+            del self._hosts[key]
+
+    async def _evict_lru(self):
+        """空闲连接总数超过 max_idle 时关闭最久未使用的连接"""
+        evicted = []
+        while len(self._idle_order) > self.max_idle:
+            client_id, key = self._idle_order.popitem(last=False)
+            state = self._hosts.get(key)
+            if state is None:
+                continue
+            for entry in state['idle']:
+                if id(entry[0]) == client_id:
+                    state['idle'].remove(entry)
+                    evicted.append(entry[0])
+                    break
+            self._drop_if_unused(key, state)
+
+        self.stats['evicted'] += len(evicted)
+        for client in evicted:
+            await self._close_client(client)
+
+    async def _evict_idle(self):
+        """回收空闲超时的连接 (最多每 idle_timeout/4 扫描一次)"""
+        now = time.monotonic()
+        if now - self._last_sweep < self.idle_timeout / 4:
+            return
+        self._last_sweep = now
+
+        expired = []
+        for key, state in list(self._hosts.items()):
+            while state['idle'] and now - state['idle'][0][1] >= self.idle_timeout:
+                client = state['idle'].popleft()[0]
+                self._idle_order.pop(id(client), None)
+                expired.append(client)
+            self._drop_if_unused(key, state)
+
+        self.stats['evicted'] += len(expired)
+        for client in expired:
+            await self._close_client(client)
+
+    @staticmethod
+    async def _close_client(client):
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+    def idle_count(self) -> int:
+        """当前空闲连接总数"""
+        return sum(len(state['idle']) for state in self._hosts.values())
+
+    async def close(self):
+        """关闭所有空闲连接 (使用中的连接在归还时关闭)"""
+        hosts, self._hosts = self._hosts, {}
+        self._idle_order.clear()
+        for state in hosts.values():
+            while state['idle']:
+                await self._close_client(state['idle'].pop()[0])
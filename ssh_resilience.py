@@ -0,0 +1,292 @@
+"""
+批量SSH任务的容错组件
+
+1. 自适应超时: 按主机/代理记录连接与命令耗时 (EWMA均值 + 偏差, 同TCP RTO算法),
+   由历史推导超时时间, 死主机快速失败, 慢主机不被误判
+2. 错误分类 + 带抖动的指数退避重试: 认证失败不重试, 超时/连接重置重试
+3. 熔断器: 按代理端口和目标主机统计连续失败, 触发后快速失败
+"""
+
+import asyncio
+import random
+import time
+from typing import Optional, Dict, Hashable
+
+import asyncssh
+
+from socks5_async import Socks5Error, ProxyUnreachableError, Socks5ConnectError
+
+
+# 错误类别
+ERROR_AUTH = 'auth'              # 认证失败, 重试无意义
+ERROR_TIMEOUT = 'timeout'        # 连接/握手超时
+ERROR_CONNECTION = 'connection'  # 连接被拒绝/重置/目标不可达
+ERROR_PROXY = 'proxy'            # 本地代理本身不可用
+ERROR_CIRCUIT_OPEN = 'circuit_open'
+ERROR_OTHER = 'other'
+
+
+def is_timeout_error(error: Optional[BaseException]) -> bool:
+    """是否为超时类错误 (赛跑连接时要求所有路径都超时)"""
+    if error is None:
+        return False
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    path_errors = getattr(error, 'errors', None)
+    if path_errors:
+        return all(is_timeout_error(e) for e in path_errors.values())
+    return '超时' in str(error) or 'timed out' in str(error).lower()
+
+
+def classify_error(error: Optional[BaseException]) -> str:
+    """把连接异常归类, 决定是否重试以及计入哪个熔断器"""
+    if error is None:
+        return ERROR_OTHER
+    if isinstance(error, CircuitOpenError):
+        return ERROR_CIRCUIT_OPEN
+
+    path_errors = getattr(error, 'errors', None)
+    if path_errors:
+        # 赛跑连接: 任一路径认证失败说明主机可达但凭据错误
+        categories = [classify_error(e) for e in path_errors.values()]
+        if ERROR_AUTH in categories:
+            return ERROR_AUTH
+        if all(c == ERROR_TIMEOUT for c in categories):
+            return ERROR_TIMEOUT
+        return ERROR_CONNECTION
+
+    if isinstance(error, (asyncssh.PermissionDenied, asyncssh.HostKeyNotVerifiable)):
+        return ERROR_AUTH
+    if is_timeout_error(error):
+        return ERROR_TIMEOUT
+    if isinstance(error, ProxyUnreachableError):
+        return ERROR_PROXY
+    if isinstance(error, Socks5ConnectError):
+        # 代理应答了但CONNECT失败 (目标拒绝/不可达), 问题在目标一侧
+        return ERROR_CONNECTION
+    if isinstance(error, Socks5Error):
+        return ERROR_PROXY
+    if isinstance(error, (OSError, asyncssh.DisconnectError, asyncssh.ConnectionLost)):
+        return ERROR_CONNECTION
+    return ERROR_OTHER
+
+
+class RetryPolicy:
+    """带抖动的指数退避重试策略"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 retry_on=(ERROR_TIMEOUT, ERROR_CONNECTION, ERROR_PROXY)):
+        """
+        Args:
+            max_attempts: 最多尝试次数 (含第一次)
+            base_delay: 首次重试前的基础等待(秒), 之后每次翻倍
+            max_delay: 单次等待上限(秒)
+            retry_on: 允许重试的错误类别, 认证失败默认不重试
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = set(retry_on)
+
+    def should_retry(self, category: str, attempt: int) -> bool:
+        return attempt < self.max_attempts and category in self.retry_on
+
+    def backoff(self, attempt: int) -> float:
+        """第attempt次失败后的等待时间 (full jitter: 0 ~ base*2^(attempt-1))"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态, 请求被快速拒绝"""
+
+
+class CircuitBreaker:
+    """
+    熔断器 (按键统计, 如 ('proxy', host, port) 或 ('target', ip, port))
+
+    连续失败达到阈值后打开, reset_timeout秒后进入半开状态放行一次试探,
+    试探成功则关闭, 失败则重新打开
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._circuits: Dict[Hashable, Dict[str, float]] = {}
+
+    def state(self, key: Hashable) -> str:
+        circuit = self._circuits.get(key)
+        if circuit is None or circuit['failures'] < self.failure_threshold:
+            return self.CLOSED
+        if circuit['trial_at'] is not None:
+            return self.HALF_OPEN
+        if time.monotonic() - circuit['opened_at'] >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self, key: Hashable) -> bool:
+        """是否放行本次请求 (半开状态下只放行一个试探请求)"""
+        circuit = self._circuits.get(key)
+        state = self.state(key)
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and circuit['trial_at'] is None:
+            circuit['trial_at'] = time.monotonic()
+            return True
+        if state == self.HALF_OPEN and time.monotonic() - circuit['trial_at'] >= self.reset_timeout:
+            # 试探请求没有回报结果 (如被取消), 允许新的试探
+            circuit['trial_at'] = time.monotonic()
+            return True
+        return False
+
+    def record_success(self, key: Hashable):
+        self._circuits.pop(key, None)
+
+    def release_trial(self, key: Hashable):
+        """试探请求的结果与该键无关 (如目标熔断的试探因代理故障失败), 放弃试探名额, 允许新的试探"""
+        circuit = self._circuits.get(key)
+        if circuit is not None:
+            circuit['trial_at'] = None
+
+    def record_failure(self, key: Hashable):
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            circuit = self._circuits[key] = {'failures': 0, 'opened_at': 0.0, 'trial_at': None}
+        circuit['failures'] += 1
+        if circuit['failures'] >= self.failure_threshold:
+            circuit['opened_at'] = time.monotonic()
+            circuit['trial_at'] = None
+
+    def open_circuits(self):
+        """当前处于打开/半开状态的键"""
+        return [key for key in self._circuits if self.state(key) != self.CLOSED]
+
+
+class RttEstimator:
+    """RTT估计器 (RFC 6298: SRTT / RTTVAR)"""
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self):
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.samples = 0
+        self.backoff = 1.0
+        self.updated_at = 0.0
+
+    def update(self, sample: float):
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - sample)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * sample
+        self.samples += 1
+        self.backoff = 1.0
+        self.updated_at = time.monotonic()
+
+    def on_timeout(self, max_backoff: float = 8.0):
+        """超时后指数退避, 避免慢主机在下一轮被再次误判"""
+        self.backoff = min(self.backoff * 2, max_backoff)
+
+    def timeout(self, k: float = 4.0) -> float:
+        """SRTT + max(SRTT, K*RTTVAR), 再乘以退避系数"""
+        return (self.srtt + max(self.srtt, k * self.rttvar)) * self.backoff
+
+
+class AdaptiveTimeouts:
+    """按主机和代理路径学习的超时时间"""
+
+    def __init__(self, default_connect: float = 30.0, default_command: float = 10.0,
+                 connect_floor: float = 3.0, connect_ceiling: float = 60.0,
+                 command_floor: float = 2.0, command_ceiling: float = 30.0,
+                 min_samples: int = 3, k: float = 4.0):
+        """
+        Args:
+            default_connect: 没有任何历史时的连接超时(秒)
+            default_command: 没有任何历史时的探测命令超时(秒)
+            connect_floor / connect_ceiling: 连接超时的下限 / 上限
+            command_floor / command_ceiling: 命令超时的下限 / 上限
+            min_samples: 代理路径至少积累多少样本后才用于推导未知主机的超时
+            k: RTTVAR系数
+        """
+        self.default_connect = default_connect
+        self.default_command = default_command
+        self.connect_floor = connect_floor
+        self.connect_ceiling = connect_ceiling
+        self.command_floor = command_floor
+        self.command_ceiling = command_ceiling
+        self.min_samples = min_samples
+        self.k = k
+        self._connect_by_host: Dict[Hashable, RttEstimator] = {}
+        self._connect_by_path: Dict[Hashable, RttEstimator] = {}
+        self._command_by_host: Dict[Hashable, RttEstimator] = {}
+
+    @staticmethod
+    def _estimator(table: Dict[Hashable, RttEstimator], key: Hashable) -> RttEstimator:
+        estimator = table.get(key)
+        if estimator is None:
+            estimator = table[key] = RttEstimator()
+        return estimator
+
+    @staticmethod
+    def _clamp(value: float, floor: float, ceiling: float) -> float:
+        return max(floor, min(ceiling, value))
+
+    def record_connect(self, host: Hashable, path: Hashable, seconds: float):
+        """记录一次成功连接的耗时 (path为代理路径, 如 ('127.0.0.1', 1081), 直连为None)"""
+        self._estimator(self._connect_by_host, host).update(seconds)
+        self._estimator(self._connect_by_path, path).update(seconds)
+
+    def record_command(self, host: Hashable, seconds: float):
+        """记录一次探测命令的往返耗时"""
+        self._estimator(self._command_by_host, host).update(seconds)
+
+    def record_connect_timeout(self, host: Hashable):
+        """
+        记录一次连接超时: 主机的超时时间指数退避
+        还没有样本的主机同样退避 (其超时借用代理路径的估计), 否则比同路径主机慢的主机永远连不上
+        """
+        self._estimator(self._connect_by_host, host).on_timeout()
+
+    def record_command_timeout(self, host: Hashable):
+        estimator = self._command_by_host.get(host)
+        if estimator and estimator.samples:
+            estimator.on_timeout()
+
+    def connect_timeout(self, host: Hashable, path: Hashable) -> float:
+        """
+        连接超时: 主机有历史时按主机推导, 否则按同一代理路径上其他主机的历史推导,
+        都没有时使用默认值
+        """
+        estimator = self._connect_by_host.get(host)
+        if estimator is not None and estimator.samples:
+            return self._clamp(estimator.timeout(self.k), self.connect_floor, self.connect_ceiling)
+
+        backoff = estimator.backoff if estimator is not None else 1.0
+        path_estimator = self._connect_by_path.get(path)
+        if path_estimator is None or path_estimator.samples < self.min_samples:
+            return self.default_connect
+        timeout = self._clamp(path_estimator.timeout(self.k), self.connect_floor, self.connect_ceiling)
+        return min(timeout * backoff, self.connect_ceiling)
+
+    def command_timeout(self, host: Hashable) -> float:
+        """探测命令超时"""
+        estimator = self._command_by_host.get(host)
+        if estimator is None or not estimator.samples:
+            return self.default_command
+        return self._clamp(estimator.timeout(self.k), self.command_floor, self.command_ceiling)
+
+    def snapshot(self, host: Hashable) -> Dict[str, Optional[float]]:
+        """查看主机的当前估计值 (调试/报表用)"""
+        connect = self._connect_by_host.get(host)
+        command = self._command_by_host.get(host)
+        return {
+            'connect_srtt': connect.srtt if connect else None,
+            'connect_rttvar': connect.rttvar if connect else None,
+            'command_srtt': command.srtt if command else None,
+        }
@@ -0,0 +1,156 @@
+"""
+多进程分片批量检测
+单个事件循环同时进行数百个SSH密钥交换时, 加解密和报文解析会占满一个CPU核心。
+本模块把VPS列表交错切分给N个子进程, 每个子进程运行独立的事件循环和AsyncSSHManager,
+结果通过队列实时传回父进程, 合并为与 test_multiple_vps 相同的结构
+
+注意: 子进程使用spawn方式启动, 在Windows上调用方脚本必须有 if __name__ == "__main__" 保护
+"""
+
+import asyncio
+import multiprocessing
+import os
+import queue as queue_module
+import traceback
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+
+from asyncssh_client import AsyncSSHManager, ResultCallback, run_async
+from ssh_timing import PhaseStats
+
+
+def _shard_main(shard_id: int, shard: List[Tuple[int, Dict[str, Any]]], result_queue,
+                max_concurrent: int, use_proxy: bool, manager_options: Dict[str, Any]):
+    """子进程入口"""
+    try:
+        run_async(_run_shard(shard, result_queue, max_concurrent, use_proxy, manager_options),
+                  use_uvloop=manager_options.get('use_uvloop', False))
+        result_queue.put(('done', shard_id, None))
+    except BaseException:
+        result_queue.put(('error', shard_id, traceback.format_exc()))
+
+
+async def _run_shard(shard: List[Tuple[int, Dict[str, Any]]], result_queue,
+                     max_concurrent: int, use_proxy: bool, manager_options: Dict[str, Any]):
+    indexes = [index for index, _ in shard]
+    async with AsyncSSHManager(**manager_options) as manager:
+        counters = manager._new_counters(shard)
+        batch = manager._run_batch((vps_info for _, vps_info in shard), max_concurrent, use_proxy, None, counters)
+        async for position, result in batch:
+            if not isinstance(result, dict):
+                # 异常对象不一定能跨进程序列化, 转换为失败结果
+                result = {'vps_info': shard[position][1], 'success': False, 'error': str(result)}
+            result_queue.put(('result', indexes[position], result))
+
+
+def _failed_result(vps_info: Dict[str, Any], error: str) -> Dict[str, Any]:
+    return {'vps_info': vps_info, 'success': False, 'error': error}
+
+
+async def test_multiple_vps_sharded(vps_list: Iterable[Dict[str, Any]], processes: Optional[int] = None,
+                                    max_concurrent: int = 10, use_proxy: bool = True,
+                                    manager_options: Optional[Dict[str, Any]] = None,
+                                    keep_results: bool = True,
+                                    on_result: Optional[ResultCallback] = None) -> Dict[str, Any]:
+    """
+    多进程批量测试VPS连接
+
+    Args:
+        vps_list: VPS信息列表
+        processes: 子进程数, 默认为CPU核心数
+        max_concurrent: 每个子进程内的最大并发数
+        use_proxy: 是否使用代理
+        manager_options: 子进程创建 AsyncSSHManager 的参数 (必须可序列化, 连接池等对象在子进程内各自创建)
+        keep_results / on_result: 同 AsyncSSHManager.test_multiple_vps
+
+    Returns:
+        Dict: 与 test_multiple_vps 相同的结构, results 按输入顺序排列
+    """
+    vps_list = list(vps_list)
+    counters = AsyncSSHManager._new_counters(vps_list)
+    processes = max(1, min(processes or os.cpu_count() or 1, len(vps_list)))
+    if not vps_list:
+        return {'total': 0, 'success': 0, 'failed': 0, 'results': [], 'phase_stats': PhaseStats().summary(),
+                'cancelled': False, 'not_attempted': 0, 'timed_out': 0}
+
+    print(f"🧩 {len(vps_list)} 台VPS分配到 {processes} 个进程, 每进程并发 {max_concurrent}")
+
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    shards = {}
+    workers = {}
+    for shard_id in range(processes):
+        # 交错切分, 避免清单中连续的慢主机集中到同一个进程
+        shards[shard_id] = [(index, vps_list[index]) for index in range(shard_id, len(vps_list), processes)]
+        workers[shard_id] = context.Process(
+            target=_shard_main,
+            args=(shard_id, shards[shard_id], result_queue, max_concurrent, use_proxy, manager_options or {}),
+            daemon=True
+        )
+
+    results: Dict[int, Any] = {}
+    phase_stats = PhaseStats()
+    received = set()
+    remaining = set(workers)
+    loop = asyncio.get_running_loop()
+
+    def get_message():
+        try:
+            return result_queue.get(timeout=0.5)
+        except queue_module.Empty:
+            return None
+
+    async def fail_shard(shard_id: int, error: str):
+        """子进程异常退出: 其未返回结果的主机记为失败"""
+        reason = error.strip().splitlines()[-1] if error.strip() else error
+        print(f"❌ 分片进程 {shard_id} 异常退出: {reason}")
+        for index, vps_info in shards[shard_id]:
+            if index not in received:
+                received.add(index)
+                result = _failed_result(vps_info, f"分片进程异常退出: {reason}")
+                if keep_results:
+                    results[index] = result
+                await AsyncSSHManager._record_result(result, counters, on_result)
+
+    for worker in workers.values():
+        worker.start()
+
+    try:
+        while remaining:
+            message = await loop.run_in_executor(None, get_message)
+            if message is None:
+                for shard_id in list(remaining):
+                    if workers[shard_id].exitcode is not None and result_queue.empty():
+                        remaining.discard(shard_id)
+                        await fail_shard(shard_id, f"退出码 {workers[shard_id].exitcode}")
+                continue
+
+            kind, key, payload = message
+            if kind == 'result':
+                received.add(key)
+                if keep_results:
+                    results[key] = payload
+                phase_stats.add(payload.get('timings'))
+                await AsyncSSHManager._record_result(payload, counters, on_result)
+            elif kind == 'done':
+                remaining.discard(key)
+            else:
+                remaining.discard(key)
+                await fail_shard(key, payload)
+    finally:
+        for worker in workers.values():
+            if worker.is_alive():
+                worker.terminate()
+            # join会阻塞, 放到线程池中等待, 不占用事件循环
+            await loop.run_in_executor(None, worker.join, 5)
+        result_queue.close()
+
+    return {
+        'total': counters['completed'],
+        'success': counters['success'],
+        'failed': counters['failed'],
+        'results': [results[i] for i in range(len(vps_list))] if keep_results else [],
+        'phase_stats': phase_stats.summary(),
+        'cancelled': False,
+        'not_attempted': AsyncSSHManager._not_attempted(counters, None),
+        'timed_out': counters['timed_out']
+    }
@@ -0,0 +1,150 @@
+"""
+SSH连接分阶段计时
+把一次检测拆分为以下阶段 (单调时钟, 单位秒):
+
+    proxy_select   选择代理端口 (缓存查询/探测、负载均衡排队)
+    socks_connect  连接代理并完成SOCKS5 CONNECT (直连时为None)
+    ssh_handshake  SSH版本交换 + 密钥交换 (直连时含TCP连接)
+    auth           用户认证
+    first_command  第一条命令 (探测命令) 往返
+    close          关闭连接 / 归还连接池
+
+复用连接池中的会话时, 建立连接的各阶段为None
+"""
+
+import math
+import time
+from typing import Optional, Dict, Any, Iterable
+
+import asyncssh
+
+PHASES = ('proxy_select', 'socks_connect', 'ssh_handshake', 'auth', 'first_command', 'close')
+
+
+def empty_timings() -> Dict[str, Optional[float]]:
+    return {phase: None for phase in PHASES}
+
+
+class TimingSSHClient(asyncssh.SSHClient):
+    """
+    通过asyncssh回调记录握手各阶段的时间点
+    connection_made: 传输层就绪 (TCP或SOCKS隧道), begin_auth: 密钥交换完成, auth_completed: 认证成功
+    """
+
+    def __init__(self, marks: Dict[str, float]):
+        self.marks = marks
+
+    def connection_made(self, conn):
+        self.marks['transport'] = time.monotonic()
+
+    def begin_auth(self, username):
+        self.marks['kex_done'] = time.monotonic()
+
+    def auth_completed(self):
+        self.marks['auth_done'] = time.monotonic()
+
+
+def connect_phases(marks: Dict[str, float], via_proxy: bool) -> Dict[str, Optional[float]]:
+    """由时间点计算 socks_connect / ssh_handshake / auth"""
+    start = marks['start']
+    transport = marks.get('transport')
+    kex_done = marks.get('kex_done')
+    auth_done = marks.get('auth_done')
+
+    phases: Dict[str, Optional[float]] = {'socks_connect': None, 'ssh_handshake': None, 'auth': None}
+    if via_proxy and transport is not None:
+        phases['socks_connect'] = transport - start
+    if kex_done is not None:
+        phases['ssh_handshake'] = kex_done - (transport if via_proxy and transport is not None else start)
+    if auth_done is not None and kex_done is not None:
+        phases['auth'] = auth_done - kex_done
+    return phases
+
+
+class _PhaseHistogram:
+    """
+    单个阶段耗时的对数分桶直方图
+    相邻桶边界相差 (1+precision) 倍, 分位数相对误差约为 precision/2;
+    桶数只取决于耗时的数量级范围 (1微秒~1小时约1100个), 与样本数无关
+    """
+
+    def __init__(self, precision: float = 0.02):
+        self._log_base = math.log1p(precision)
+        self._base = 1 + precision
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.floor(math.log(value) / self._log_base)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def percentile(self, percentile: float) -> float:
+        """最近秩法分位数 (取所在桶的几何中点, 并限制在 [min, max] 内)"""
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        if rank <= self.zeros:
+            return 0.0
+        seen = self.zeros
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                value = self._base ** (index + 0.5)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+class PhaseStats:
+    """批量任务中各阶段耗时的汇总 (固定大小的直方图, 内存不随主机数增长)"""
+
+    def __init__(self):
+        self._histograms: Dict[str, _PhaseHistogram] = {phase: _PhaseHistogram() for phase in PHASES}
+
+    def add(self, timings: Optional[Dict[str, Optional[float]]]):
+        if not timings:
+            return
+        for phase in PHASES:
+            value = timings.get(phase)
+            if value is not None:
+                self._histograms[phase].add(value)
+
+    def add_many(self, results: Iterable[Any]):
+        for result in results:
+            if isinstance(result, dict):
+                self.add(result.get('timings'))
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns:
+            {阶段: {'count', 'total', 'mean', 'p50', 'p95', 'max', 'share'}}
+            share 为该阶段总耗时占全部阶段总耗时的比例, 用于判断时间花在了哪里;
+            p50 / p95 由直方图估计, 相对误差约1%
+        """
+        grand_total = sum(histogram.total for histogram in self._histograms.values())
+        summary = {}
+        for phase in PHASES:
+            histogram = self._histograms[phase]
+            if not histogram.count:
+                summary[phase] = {'count': 0, 'total': 0.0, 'mean': None, 'p50': None,
+                                  'p95': None, 'max': None, 'share': 0.0}
+                continue
+            total = histogram.total
+            summary[phase] = {
+                'count': histogram.count,
+                'total': round(total, 4),
+                'mean': round(total / histogram.count, 4),
+                'p50': round(histogram.percentile(50), 4),
+                'p95': round(histogram.percentile(95), 4),
+                'max': round(histogram.max, 4),
+                'share': round(total / grand_total, 4) if grand_total else 0.0,
+            }
+        return summary
@@ -0,0 +1,97 @@
+"""
+SSH连接池回归测试
+max_per_host=1 且多个协程使用同一个键时, 等待名额的协程不能拿到已被删除的主机状态,
+归还连接时也不能释放到其他状态的信号量上 (否则超出并发上限或永久挂起)
+
+运行: python -m pytest test_ssh_pool.py  或  python test_ssh_pool.py
+"""
+
+import asyncio
+
+from ssh_pool import SSHConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+
+class FakeClient:
+    def __init__(self):
+        self.connection = FakeConnection()
+
+    async def execute_command(self, command, timeout=None):
+        return '', '', 0
+
+    async def close(self):
+        self.connection.closed = True
+
+
+async def _run_duplicate_keys(keep: bool, workers: int = 8):
+    pool = SSHConnectionPool(max_per_host=1)
+    active = 0
+    peak = 0
+
+    async def connect():
+        await asyncio.sleep(0.01)
+        return FakeClient()
+
+    async def use():
+        nonlocal active, peak
+        async with pool.connection(('10.0.0.1', 22, 'root', None), connect, keep=keep) as client:
+            assert client is not None
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    await asyncio.wait_for(asyncio.gather(*(use() for _ in range(workers))), timeout=5)
+    await pool.close()
+    return peak, pool
+
+
+def test_duplicate_keys_without_keep():
+    peak, pool = asyncio.run(_run_duplicate_keys(keep=False))
+    assert peak == 1
+    assert pool.stats['created'] == 8
+    assert not pool._leases
+
+
+def test_duplicate_keys_with_keep():
+    peak, pool = asyncio.run(_run_duplicate_keys(keep=True))
+    assert peak == 1
+    assert pool.stats['created'] == 1
+    assert pool.stats['reused'] == 7
+
+
+def test_cancelled_waiter_releases_state():
+    async def run():
+        pool = SSHConnectionPool(max_per_host=1)
+        key = ('10.0.0.1', 22, 'root', None)
+
+        async def connect():
+            return FakeClient()
+
+        holder = await pool.acquire(key, connect)
+        waiter = asyncio.ensure_future(pool.acquire(key, connect))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        await pool.release(key, holder, discard=True)
+        return pool
+
+    pool = asyncio.run(run())
+    assert not pool._hosts
+
+
+if __name__ == '__main__':
+    test_duplicate_keys_without_keep()
+    test_duplicate_keys_with_keep()
+    test_cancelled_waiter_releases_state()
+    print("✅ 连接池测试通过")